@@ -0,0 +1,58 @@
+### Author: Edward Huang
+
+import argparse
+import multiprocessing
+import run_prosnet
+import subprocess
+from sweep_prosnet_dimensions import read_logrank_table
+import time
+
+### This script compares the embed binary against the in-process NumPy
+### trainer of run_prosnet.py (-b numpy). Both train on the same network,
+### bypassing the embedding cache. Reports the wall time of each, and the
+### log-rank chi-squared and p-value of each subtype after enriching and
+### clustering with their vectors.
+
+def parse_args():
+    global args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--num_dim', help='number of ProSNet dimensions',
+        required=True, type=int)
+    parser.add_argument('-s', '--sim_thresh', default='0.3',
+        help='cosine similarity threshold for the enrichment')
+    parser.add_argument('-c', '--num_cores', type=int,
+        default=multiprocessing.cpu_count(), help='cores for training')
+    args = parser.parse_args()
+
+def train_and_cluster(backend):
+    '''
+    Trains the vectors with the backend, then enriches and clusters. Returns
+    the training time and the log-rank statistics.
+    '''
+    start_time = time.time()
+    run_prosnet.run_prosnet(args.num_dim, args.num_cores, use_cache=False,
+        backend=backend)
+    train_time = time.time() - start_time
+
+    prosnet_args = '-d %d -s %s' % (args.num_dim, args.sim_thresh)
+    subprocess.check_call('python build_patient_feature_matrix.py %s' %
+        prosnet_args, shell=True)
+    subprocess.check_call('python cluster_cancer_subtypes.py %s -p 1' %
+        prosnet_args, shell=True)
+    return train_time, read_logrank_table('prosnet_%d_%s' % (args.num_dim,
+        args.sim_thresh))
+
+def main():
+    parse_args()
+    run_prosnet.write_network()
+
+    result_lst = [(backend, train_and_cluster(backend)) for backend in (
+        'embed', 'numpy')]
+    print 'backend\ttrain_seconds\tsubtype\tchisq\tp_value'
+    for backend, (train_time, logrank_lst) in result_lst:
+        for (subtype, chisq, p_value) in logrank_lst:
+            print '%s\t%g\t%s\t%g\t%g' % (backend, train_time, subtype, chisq,
+                p_value)
+
+if __name__ == '__main__':
+    main()
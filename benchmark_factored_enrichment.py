@@ -0,0 +1,76 @@
+### Author: Edward Huang
+
+import argparse
+from build_patient_feature_matrix import factor_missing_data
+from build_patient_feature_matrix import impute_missing_data, read_prosnet_output
+from file_operations import read_feature_matrix
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.preprocessing import normalize
+import time
+
+### This script compares the factored enrichment of build_patient_feature_
+### matrix.py (-m factored) against the thresholded enrichment at -s 0. Reports
+### the wall time of both, and how far the factored matrix is from the exact
+### signed product and from the current np.abs semantics.
+
+def parse_args():
+    global args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--num_dim', help='number of ProSNet dimensions',
+        required=True)
+    parser.add_argument('-r', '--repeats', help='timing repeats', type=int,
+        default=3)
+    args = parser.parse_args()
+
+def time_enrichment(enrich, feature_matrix, feature_lst):
+    '''
+    Returns the best wall time over the repeats, and the enriched matrix.
+    '''
+    best_time = float('inf')
+    for i in range(args.repeats):
+        start_time = time.time()
+        enriched_matrix = enrich(feature_matrix, feature_lst, args.num_dim)
+        best_time = min(best_time, time.time() - start_time)
+    if issparse(enriched_matrix):
+        enriched_matrix = enriched_matrix.toarray()
+    return best_time, enriched_matrix
+
+def print_comparison(name, approx_matrix, exact_matrix):
+    '''
+    Prints the relative Frobenius error, and the mean cosine similarity between
+    matching patient rows. Clustering normalizes rows, so the latter is what
+    matters downstream.
+    '''
+    rel_err = np.linalg.norm(approx_matrix - exact_matrix) / np.linalg.norm(
+        exact_matrix)
+    row_cos = np.sum(normalize(approx_matrix) * normalize(exact_matrix), axis=1)
+    print '%s\trelative error %g\tmean row cosine %g\tmin row cosine %g' % (
+        name, rel_err, np.mean(row_cos), np.min(row_cos))
+
+def main():
+    parse_args()
+    feature_matrix, feature_lst, survival_mat = read_feature_matrix('_raw',
+        dense=False)
+
+    threshold_time, threshold_matrix = time_enrichment(lambda matrix, lst,
+        num_dim: impute_missing_data(matrix, lst, num_dim, 0.0),
+        feature_matrix, feature_lst)
+    factored_time, factored_matrix = time_enrichment(factor_missing_data,
+        feature_matrix, feature_lst)
+    print 'threshold enrichment (s)\t%g' % threshold_time
+    print 'factored enrichment (s)\t%g' % factored_time
+
+    # Exact signed product, to separate rounding from the np.abs difference.
+    vector_matrix = normalize(read_prosnet_output(feature_lst, args.num_dim))
+    signed_matrix = np.dot(vector_matrix, vector_matrix.T)
+    off_diag = ~np.eye(len(signed_matrix), dtype=bool)
+    print 'fraction of negative similarities\t%g' % np.mean(signed_matrix[
+        off_diag] < 0)
+    np.fill_diagonal(signed_matrix, 1)
+    signed_matrix = feature_matrix.dot(signed_matrix)
+    print_comparison('factored vs. signed', factored_matrix, signed_matrix)
+    print_comparison('factored vs. abs', factored_matrix, threshold_matrix)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,16 @@
 ### Author: Edward Huang
 
+from array import array
 import argparse
-from file_operations import read_spreadsheet, read_smoking_history
+from file_operations import get_feature_matrix_fnames, read_spreadsheet
+from file_operations import read_smoking_history
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+from prosnet_vectors import ProsnetVectorStore
+import resource
+from rwr_similarity import get_rwr_similarity_matrix
+from scipy.sparse import csr_matrix, issparse, save_npz
+from sklearn.preprocessing import normalize
 
 # This script creates the feature matrix inputs for clustering.
 
@@ -11,11 +18,30 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--num_dim', help='Optional. Number of ProSNet dimensions.')
     parser.add_argument('-s', '--sim_thresh', help='Optional. Threshold for cosine similarity between ProSNet vectors.')
+    parser.add_argument('-l', '--sim_thresh_list', help='Optional. Comma-separated thresholds to sweep in one run, instead of -s.')
+    parser.add_argument('-m', '--enrich_mode', choices=['threshold', 'factored', 'latent'], default='threshold', help='Optional. "factored" computes the -s 0 enrichment as (X V)V^T without the similarity matrix, using signed cosines. "latent" keeps the patients in the ProSNet space, X V.')
+    parser.add_argument('-i', '--iteration', type=int, help='Optional. ProSNet snapshot to read vectors from. Defaults to the last iteration.')
+    parser.add_argument('-t', '--tsv', action='store_true', help='Optional. Also export the matrix as a TSV, e.g. for the R scripts.')
+    parser.add_argument('-f', '--float32', action='store_true', help='Optional. Store the binary matrix in single precision.')
+    parser.add_argument('-r', '--rwr', action='store_true', help='Optional. Enrich with random walk with restart proximities on the ProSNet network instead of ProSNet vectors. Takes -s and/or -k, but no -d.')
+    parser.add_argument('-k', '--top_k', type=int, help='Optional. With -r, number of largest proximities to keep per feature.')
     args = parser.parse_args()
-    if args.num_dim == None:
-        assert args.sim_thresh == None
+    if args.rwr:
+        assert args.num_dim == None and args.sim_thresh_list == None
+        assert args.enrich_mode == 'threshold'
+        assert args.sim_thresh != None or args.top_k != None
+    elif args.num_dim == None:
+        assert args.sim_thresh == None and args.sim_thresh_list == None
+        assert args.enrich_mode == 'threshold'
+    elif args.enrich_mode != 'threshold':
+        # The factored modes have no threshold.
+        assert args.sim_thresh == None and args.sim_thresh_list == None
     else:
-        assert args.num_dim.isdigit() and args.sim_thresh != None
+        assert args.num_dim.isdigit()
+        # Exactly one of -s and -l.
+        assert (args.sim_thresh == None) != (args.sim_thresh_list == None)
+        if args.sim_thresh_list != None:
+            args.sim_thresh_list = map(float, args.sim_thresh_list.split(','))
     return args
 
 def create_dct_lst():
@@ -23,7 +49,7 @@ def create_dct_lst():
     Creates a list of feature dictionaries for each spreadsheet. Also returns
     a list maintaining the unique features across all spreadsheets.
     '''
-    feature_dct_list, master_feature_lst = [], []
+    feature_dct_list, master_feature_lst, master_feature_set = [], [], set([])
     for fname in ('cancer_other_info_herbmed', 'cancer_other_info_mr_symp',
         'cancer_syndrome_syndromes', 'cancer_check_20170324',
         'cancer_drug_2017_sheet2', 'smoking_history', 'cancer_caseinfo'):
@@ -38,88 +64,227 @@ def create_dct_lst():
         # Update the master feature list. Some symptoms occur in the tests, so
         # we must take care of duplicates.
         for feature in feature_list:
-            if feature not in master_feature_lst:
+            if feature not in master_feature_set:
+                master_feature_set.add(feature)
                 master_feature_lst += [feature]
     return feature_dct_list, master_feature_lst
 
 def build_feature_matrix(feature_dct_list, master_feature_lst, patient_list):
     '''
-    Takes the feature list and a dictionary, and build a feature matrix.
+    Takes the feature list and a dictionary, and builds a sparse CSR feature
+    matrix from (patient, feature, frequency) triplets. Repeated features for
+    the same patient are summed. Columns without any nonzero entries are
+    removed, along with their labels.
     '''
-    feature_matrix = []
-
-    for inhospital_id in patient_list:
-        # Initialize the row for the patient.
-        row = [0 for i in master_feature_lst]
+    feature_idx_dct = dict((feature, i) for i, feature in enumerate(
+        master_feature_lst))
+    row_idx_arr, col_idx_arr, data_arr = array('i'), array('i'), array('d')
+    for row_idx, inhospital_id in enumerate(patient_list):
         # Get the values from each of the feature dictionaries.
         for feature_dct in feature_dct_list:
             # An inhospital ID might not be in feature_dct with prosnet.
             if inhospital_id not in feature_dct:
                 continue
             for (feature, feature_freq) in feature_dct[inhospital_id]:
-                row[master_feature_lst.index(feature)] += feature_freq
-        feature_matrix += [row]
-    feature_matrix = np.array(feature_matrix)
+                row_idx_arr.append(row_idx)
+                col_idx_arr.append(feature_idx_dct[feature])
+                data_arr.append(feature_freq)
+    feature_matrix = csr_matrix((np.frombuffer(data_arr, dtype=np.float64), (
+        np.frombuffer(row_idx_arr, dtype=np.intc), np.frombuffer(col_idx_arr,
+        dtype=np.intc))), shape=(len(patient_list), len(master_feature_lst)))
+    # Duplicates are summed on conversion. Drop any sums that cancelled out.
+    feature_matrix.sum_duplicates()
+    feature_matrix.eliminate_zeros()
 
     # Remove the bad columns.
-    zero_column_indices = np.where(~feature_matrix.any(axis=0))[0]
-    good_indices = [i for i in range(len(master_feature_lst)
-        ) if i not in zero_column_indices]
-    master_feature_lst = [e for i, e in enumerate(master_feature_lst
-        ) if i in good_indices]
+    col_nnz = np.bincount(feature_matrix.indices, minlength=len(
+        master_feature_lst))
+    good_indices = np.flatnonzero(col_nnz)
+    master_feature_lst = [master_feature_lst[i] for i in good_indices]
 
     return feature_matrix[:,good_indices], master_feature_lst
 
-def impute_missing_data(feature_matrix, master_feature_lst, num_dim, sim_thresh):
+def read_prosnet_output(master_feature_lst, num_dim, iteration=None):
+    '''
+    Reads the output low-dimensional vectors created by prosnet, in the order
+    of master_feature_lst. Defaults to the last iteration's snapshot.
+    '''
+    vector_store = ProsnetVectorStore(num_dim, iteration)
+    print 'ProSNet vectors: %s dimensions, iteration %d' % (num_dim,
+        vector_store.iteration)
+    return np.array(vector_store.get_vector_matrix(master_feature_lst))
+
+def impute_missing_data(feature_matrix, master_feature_lst, num_dim, sim_thresh,
+    iteration=None):
     '''
     Given the feature matrix and the column labels (master_feature_lst), impute
     the missing feature data by getting the Prosnet vectors.
     '''
-    def read_prosnet_output(master_feature_lst, num_dim):
-        '''
-        Reads the output low-dimensional vectors created by prosnet.
-        '''
-        vector_dct = {}
-        # TODO: Currently taking last iteration number, 500. Can do other files.
-        f = open('./data/prosnet_data/prosnet_vectors_%s_500' % num_dim, 'r')
-        for i, line in enumerate(f):
-            if i == 0:
-                continue
-            line = line.split()
-            feature, vector = line[0], map(float, line[1:])
-            assert len(vector) == int(num_dim) and feature not in vector_dct
-            vector_dct[feature] = vector
-        f.close()
-        # Reorganize the matrix according to the order of master_feature_lst.
-        vector_matrix = []
-        for feature in master_feature_lst:
-            vector_matrix += [vector_dct[feature]]
-        return np.array(vector_matrix)
-
-    vector_matrix = read_prosnet_output(master_feature_lst, num_dim)
-    similarity_matrix = np.abs(cosine_similarity(vector_matrix))
-
-    similarity_matrix[similarity_matrix < sim_thresh] = 0
-    # Refill diagonals with 1s in cases of rounding errors.
-    np.fill_diagonal(similarity_matrix, 1)
-    print similarity_matrix # TODO
-    print np.array_equal(similarity_matrix, np.identity(len(similarity_matrix)))
+    vector_matrix = read_prosnet_output(master_feature_lst, num_dim,
+        iteration)
+    similarity_matrix = get_similarity_matrix(vector_matrix, sim_thresh)
+    return enrich_feature_matrix(feature_matrix, similarity_matrix)
+
+def impute_rwr_data(feature_matrix, master_feature_lst, sim_thresh=None,
+    top_k=None):
+    '''
+    Imputes the missing feature data with random walk with restart
+    proximities on the ProSNet network, instead of ProSNet vectors.
+    '''
+    similarity_matrix = get_rwr_similarity_matrix(master_feature_lst,
+        sim_thresh=sim_thresh, top_k=top_k)
+    return enrich_feature_matrix(feature_matrix, similarity_matrix)
+
+def enrich_feature_matrix(feature_matrix, similarity_matrix):
+    print 'retained similarities:', similarity_matrix.nnz
     # Multiply the feature matrix and the similarity matrix.
-    enriched_feature_matrix = np.dot(feature_matrix, similarity_matrix)
+    enriched_feature_matrix = csr_matrix(feature_matrix).dot(similarity_matrix)
+    print_peak_memory()
 
     return enriched_feature_matrix
 
+def sweep_missing_data(feature_matrix, master_feature_lst, num_dim,
+    sim_thresh_lst, iteration=None):
+    '''
+    Imputes the missing data for every threshold in sim_thresh_lst, while
+    reading the vectors and computing the similarities only once. Thresholds
+    are visited in decreasing order. Each step adds to the previous enriched
+    matrix only the similarities that cross the new threshold. Yields
+    (sim_thresh, enriched feature matrix) pairs.
+    '''
+    vector_matrix = read_prosnet_output(master_feature_lst, num_dim,
+        iteration)
+    similarity_matrix = get_similarity_matrix(vector_matrix, min(
+        sim_thresh_lst)).tocoo()
+    # Sort the off-diagonal similarities by decreasing value.
+    is_off_diag = similarity_matrix.row != similarity_matrix.col
+    sim_row_idx = similarity_matrix.row[is_off_diag]
+    sim_col_idx = similarity_matrix.col[is_off_diag]
+    sim_data = similarity_matrix.data[is_off_diag]
+    sort_idx = np.argsort(-sim_data, kind='mergesort')
+    sim_row_idx, sim_col_idx = sim_row_idx[sort_idx], sim_col_idx[sort_idx]
+    neg_sim_data = -sim_data[sort_idx]
+
+    # The unit diagonal contributes the raw feature matrix itself.
+    feature_matrix = csr_matrix(feature_matrix)
+    enriched_feature_matrix, num_added = feature_matrix.copy(), 0
+    for sim_thresh in sorted(set(sim_thresh_lst), reverse=True):
+        # Number of similarities that are at least sim_thresh.
+        num_kept = np.searchsorted(neg_sim_data, -sim_thresh, side='right')
+        new_similarities = csr_matrix((-neg_sim_data[num_added:num_kept], (
+            sim_row_idx[num_added:num_kept], sim_col_idx[num_added:num_kept])),
+            shape=similarity_matrix.shape)
+        enriched_feature_matrix = enriched_feature_matrix + feature_matrix.dot(
+            new_similarities)
+        num_added = num_kept
+        print 'retained similarities at %g:' % sim_thresh, num_kept + len(
+            master_feature_lst)
+        yield sim_thresh, enriched_feature_matrix
+    print_peak_memory()
+
+def factor_missing_data(feature_matrix, master_feature_lst, num_dim,
+    keep_latent=False, iteration=None):
+    '''
+    Low-rank version of impute_missing_data with no threshold. Uses the
+    identity X S = (X V)V^T, where V holds the normalized ProSNet vectors, so
+    the F x F similarity matrix is never formed. Costs O(N F d) instead of
+    O(F^2). Unlike impute_missing_data, similarities keep their sign rather
+    than taking np.abs. If keep_latent, returns the N x d matrix X V instead.
+    '''
+    vector_matrix = normalize(read_prosnet_output(master_feature_lst, num_dim,
+        iteration))
+    feature_matrix = csr_matrix(feature_matrix)
+    latent_matrix = feature_matrix.dot(vector_matrix)
+    if keep_latent:
+        return latent_matrix
+    enriched_feature_matrix = np.dot(latent_matrix, vector_matrix.T)
+    # Zero vectors have no self-similarity in V V^T, but the diagonal is 1.
+    zero_vector_idx = np.flatnonzero(~vector_matrix.any(axis=1))
+    enriched_feature_matrix[:,zero_vector_idx] += feature_matrix[:,
+        zero_vector_idx].toarray()
+    print_peak_memory()
+    return enriched_feature_matrix
+
+def print_peak_memory():
+    # ru_maxrss is in kilobytes on Linux.
+    print 'peak memory (MB):', resource.getrusage(resource.RUSAGE_SELF
+        ).ru_maxrss / 1024.0
+
+def get_similarity_matrix(vector_matrix, sim_thresh, max_tile_size=2 ** 23):
+    '''
+    Computes the absolute cosine similarities between the rows of
+    vector_matrix, one block of rows at a time, so the full dense matrix is
+    never held in memory. Each tile holds at most max_tile_size entries.
+    Similarities below sim_thresh are dropped, and the diagonal is always 1.
+    Returns a sparse CSR matrix.
+    '''
+    norm_matrix = normalize(vector_matrix)
+    num_rows = norm_matrix.shape[0]
+    block_size = max(1, max_tile_size // max(num_rows, 1))
+    row_idx_lst, col_idx_lst, data_lst = [], [], []
+    for start in range(0, num_rows, block_size):
+        end = min(start + block_size, num_rows)
+        tile = np.abs(np.dot(norm_matrix[start:end], norm_matrix.T))
+        # Zero entries add nothing to the enrichment, so never keep them.
+        keep = (tile >= sim_thresh) & (tile != 0)
+        # The diagonal is set separately, in cases of rounding errors.
+        keep[np.arange(end - start), np.arange(start, end)] = False
+        tile_row_idx, tile_col_idx = np.nonzero(keep)
+        row_idx_lst += [tile_row_idx + start]
+        col_idx_lst += [tile_col_idx]
+        data_lst += [tile[tile_row_idx, tile_col_idx]]
+    # Refill diagonals with 1s.
+    row_idx_lst += [np.arange(num_rows)]
+    col_idx_lst += [np.arange(num_rows)]
+    data_lst += [np.ones(num_rows)]
+    return csr_matrix((np.concatenate(data_lst), (np.concatenate(row_idx_lst),
+        np.concatenate(col_idx_lst))), shape=(num_rows, num_rows))
+
 def write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
-    survival_dct, fname_suffix):
+    survival_dct, fname_suffix, write_tsv=False, dtype=np.float64):
+    '''
+    Writes the feature matrix out to file in binary form: a .npz payload for
+    sparse matrices and a memory-mappable .npy for dense ones, cast to dtype.
+    A sidecar file holds the column labels and the inhospital_id's and
+    death/time events of the rows. Optionally also exports a TSV, whose first
+    column is the inhospital_id's and second/third columns the death/time.
+    '''
+    tsv_fname, npy_fname, npz_fname, index_fname = get_feature_matrix_fnames(
+        fname_suffix)
+    # The payload goes last: readers pick the most recently written format.
+    if write_tsv:
+        write_feature_matrix_tsv(feature_matrix, master_feature_lst,
+            patient_list, survival_dct, tsv_fname)
+    out = open(index_fname, 'w')
+    out.write('patient_id\tdeath\ttime\t%s\n' % '\t'.join(master_feature_lst))
+    for inhospital_id in patient_list:
+        death, time = survival_dct[inhospital_id][0] # one event per patient.
+        out.write('%s\t%d\t%f\n' % (inhospital_id, death, time))
+    out.close()
+
+    # Remove the payload of the other type, so the reader can't pick it up.
+    if issparse(feature_matrix):
+        save_npz(npz_fname, feature_matrix.tocsr().astype(dtype))
+        stale_fname = npy_fname
+    else:
+        np.save(npy_fname, np.asarray(feature_matrix, dtype=dtype))
+        stale_fname = npz_fname
+    if os.path.exists(stale_fname):
+        os.remove(stale_fname)
+
+def write_feature_matrix_tsv(feature_matrix, master_feature_lst, patient_list,
+    survival_dct, out_fname):
     '''
-    Writes the feature matrix out to file, along with column labels. First
+    Writes the feature matrix out to a TSV, along with column labels. First
     column should be inhospital_id's, and the second/third column should be the
     death/time event.
     '''
-    out_fname = './data/feature_matrices/feature_matrix%s.txt' % fname_suffix
     out = open(out_fname, 'w')
     out.write('patient_id\tdeath\ttime\t%s\n' % '\t'.join(master_feature_lst))
-    for i, row in enumerate(feature_matrix):
+    for i in range(feature_matrix.shape[0]):
+        row = feature_matrix[i]
+        if issparse(row):
+            row = row.toarray()[0]
         inhospital_id = patient_list[i]
         death, time = survival_dct[inhospital_id][0] # one event per patient.
         out.write('%s\t%d\t%f\t%s\n' % (inhospital_id, death, time, '\t'.join(
@@ -130,7 +295,10 @@ def print_sparsity_stats(feature_matrix):
     '''
     Prints average number of zero values for each patient.
     '''
-    num_zeros = np.count_nonzero(feature_matrix==0)
+    if issparse(feature_matrix):
+        num_zeros = np.prod(feature_matrix.shape) - feature_matrix.nnz
+    else:
+        num_zeros = np.count_nonzero(feature_matrix==0)
     print 'average number of zeros:', num_zeros / float(feature_matrix.shape[0])
     print 'feature matrix shape:', feature_matrix.shape
 
@@ -146,19 +314,51 @@ def main():
         master_feature_lst, patient_list)
 
     args = parse_args()
-    if args.num_dim == None:
-        fname_suffix = '_raw'
+    dtype = np.float32 if args.float32 else np.float64
+    if args.rwr:
+        sim_thresh = None if args.sim_thresh == None else float(args.sim_thresh)
+        feature_matrix = impute_rwr_data(feature_matrix, master_feature_lst,
+            sim_thresh, args.top_k)
+        # E.g. _rwr_0.01, _rwr_k50 or _rwr_0.01_k50.
+        label_lst = [] if sim_thresh == None else ['%g' % sim_thresh]
+        if args.top_k != None:
+            label_lst += ['k%d' % args.top_k]
+        write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
+            survival_dct, '_rwr_%s' % '_'.join(label_lst), args.tsv, dtype)
+    elif args.num_dim == None:
+        write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
+            survival_dct, '_raw', args.tsv, dtype)
+    elif args.sim_thresh_list != None:
+        # Enrich for every threshold off a single similarity computation.
+        for sim_thresh, enriched_feature_matrix in sweep_missing_data(
+            feature_matrix, master_feature_lst, args.num_dim,
+            args.sim_thresh_list, args.iteration):
+            write_feature_matrix(enriched_feature_matrix, master_feature_lst,
+                patient_list, survival_dct, '_%s_%g' % (args.num_dim,
+                sim_thresh), args.tsv, dtype)
+    elif args.enrich_mode == 'factored':
+        feature_matrix = factor_missing_data(feature_matrix, master_feature_lst,
+            args.num_dim, iteration=args.iteration)
+        write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
+            survival_dct, '_%s_factored' % args.num_dim, args.tsv, dtype)
+    elif args.enrich_mode == 'latent':
+        feature_matrix = factor_missing_data(feature_matrix, master_feature_lst,
+            args.num_dim, keep_latent=True, iteration=args.iteration)
+        # Columns are ProSNet dimensions, not features.
+        latent_feature_lst = ['prosnet_%d' % i for i in range(
+            feature_matrix.shape[1])]
+        write_feature_matrix(feature_matrix, latent_feature_lst, patient_list,
+            survival_dct, '_%s_latent' % args.num_dim, args.tsv, dtype)
     else:
         # Get the number of ProSNet dimensions and the cosine similarity threshold.
         num_dim, sim_thresh = args.num_dim, float(args.sim_thresh)
         feature_matrix = impute_missing_data(feature_matrix, master_feature_lst,
-            num_dim, sim_thresh)
+            num_dim, sim_thresh, args.iteration)
         # Add num_dim and sim_thresh to the filename suffix.
         fname_suffix = '_%s_%g' % (num_dim, sim_thresh)
-
-    # Write out matrix out to file.
-    write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
-        survival_dct, fname_suffix)
+        # Write out matrix out to file.
+        write_feature_matrix(feature_matrix, master_feature_lst, patient_list,
+            survival_dct, fname_suffix, args.tsv, dtype)
 
     # print_sparsity_stats(feature_matrix)
 
@@ -4,22 +4,34 @@
 ### Author: Edward Huang
 
 import argparse
-from collections import Counter
+from collections import Counter, namedtuple
+from column_stats import ttest_columns
+from decomposition import pca_transform
 from file_operations import read_feature_matrix, read_spreadsheet, read_smoking_history
 import itertools
+from kmeans_restarts import fit_kmeans
+import multiprocessing
 import os
 import numpy as np
 import operator
-from scipy.spatial.distance import pdist, squareform
-from scipy.stats import ttest_ind
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA, TruncatedSVD
+from patient_distance import get_cosine_distance_matrix
+from scipy.sparse import issparse
 from sklearn.preprocessing import normalize, Imputer
-import subprocess
+from survival import get_survival_arrays, get_survival_summary, logrank_test
+from survival import print_survival_summary
 # import sys
 
+# Everything the sweep jobs read, loaded once. subtype_idx_dct maps each cancer
+# subtype to its patient rows, and col_idx_dct maps each feature type to its
+# columns.
+SweepData = namedtuple('SweepData', ['feature_matrix', 'base_feature_matrix',
+    'feature_list', 'survival_mat', 'subtype_idx_dct', 'col_idx_dct'])
+# Outcome of clustering one subtype on one feature combination.
+SweepResult = namedtuple('SweepResult', ['feat_comb', 'subtype', 'labels',
+    'chisq', 'p_value', 'feature_p_val_lst'])
+
 def generate_directories():
-    global df_folder, feat_folder
+    global df_folder, feat_folder, plot_folder
     df_folder = './data/patient_dataframes_seq'
     feat_folder = './results/feature_p_values_seq'
     plot_folder = './results/survival_plots_seq'
@@ -30,9 +42,11 @@ def generate_directories():
 def get_feat_combination_list(args):
     '''
     Gets the combination of features to be used in the clustering process. Can
-    be full, partial, or just VKPS.
+    be full, partial, just VKPS, or all ProSNet dimensions of a latent matrix.
     '''
-    if args.other_feat == 'vkps':
+    if args.latent:
+        feat_comb_list = [['latent']]
+    elif args.other_feat == 'vkps':
         feat_comb_list = [['VKPS']]
     # Current best partial subset of features is symptoms and history.
     elif args.partial != None:
@@ -97,32 +111,29 @@ def get_col_idx_lst(feature_list, feat_comb):
     col_idx_lst = [i for i, e in enumerate(feature_list) if e in feat_set]
     return col_idx_lst
 
-def get_cluster_labels(feature_matrix, args):
+def get_cluster_labels(feature_matrix, args, num_processes=None):
     '''
     Clusters using K-Means with 2 clusters on the dimensionality-reduced matrix.
+    The restarts run on num_processes processes, or on args.num_jobs.
     '''
     # BCB paper uses this normalization (by patient).
     norm_matrix = normalize(feature_matrix, norm='max') # BCB
     # norm_matrix = normalize(feature_matrix, norm='max', axis=0) # New
 
     # Perform PCA.
-    # BCB paper uses this component number.
-    num_comp = int(feature_matrix.shape[1] * 0.2) # BCB
+    # BCB paper uses this component number (-c 0.2).
+    num_comp = int(feature_matrix.shape[1] * args.comp_ratio) # BCB
     # num_comp = 2 # New
-    # Base matrix, because it's sparse, uses truncated SVD. BCB paper uses PCA only.
-    # if args.num_dim == None and args.other_feat == None:
-    #     svd = TruncatedSVD(n_components=num_comp, random_state=930519) # New
-    #     decomp_matrix = svd.fit_transform(norm_matrix) # New
-    # # Denser matrices with PCA.
-    # else:
-    pca = PCA(n_components=num_comp)
-    decomp_matrix = pca.fit_transform(norm_matrix)
-    # BCB runs k-means on the distance matrix.
-    decomp_matrix = squareform(pdist(decomp_matrix, 'cosine')) # BCB
+    # Sparse matrices use randomized PCA with implicit centering. Cached on
+    # disk, keyed by the matrix and num_comp.
+    decomp_matrix = pca_transform(norm_matrix, num_comp).transformed_matrix
+    # BCB runs k-means on the distance matrix. Memory-mapped above the budget.
+    decomp_matrix = get_cosine_distance_matrix(decomp_matrix,
+        args.memory_budget * 1024 ** 2) # BCB
     # Always cluster with 2 clusters.
-    est = KMeans(n_clusters=2, n_init=1000, random_state=930519)
-    est.fit(decomp_matrix)
-    return list(est.labels_)
+    return fit_kmeans(decomp_matrix, n_clusters=2, n_init=1000,
+        random_state=930519, patience=args.patience,
+        num_processes=num_processes or args.num_jobs).labels
 
 # def get_vkps_labels(base_feature_matrix):
 #     '''
@@ -132,16 +143,22 @@ def get_cluster_labels(feature_matrix, args):
 #     labels = 
 #     return labels
 
+def get_cluster_tags(labels):
+    '''
+    Tags the patients of the largest cluster with 0, and all others with 1.
+    '''
+    # First, determine the index of the larger cluster.
+    max_clus = Counter(labels).most_common(1)[0][0]
+    # Larger cluster gets label 1.
+    return [0 if label == max_clus else 1 for label in labels]
+
 def write_clusters(labels, survival_mat, out_name):
     '''
     Given the labels, write the clusters out to file. For situations in which
     we only have two clusters, merge the smaller clusters and label it 0.
     '''
     assert len(labels) == len(survival_mat)
-    # First, determine the index of the larger cluster.
-    max_clus = Counter(labels).most_common(1)[0][0]
-    # Larger cluster gets label 1.
-    tag_list = [0 if label == max_clus else 1 for label in labels]
+    tag_list = get_cluster_tags(labels)
 
     out = open(out_name, 'w')
     out.write('death\ttime\tcluster\n')
@@ -158,148 +175,243 @@ def feature_analysis(labels, feature_matrix, feature_list, out_name,
     and sort by p-value. Write out to file. Only write for two clusters.
     Optional argument symptom_line is only used in sequential clustering.
     '''
+    write_feature_p_values(get_feature_p_values(labels, feature_matrix,
+        feature_list), out_name, symp_line)
+
+def get_feature_p_values(labels, feature_matrix, feature_list):
+    '''
+    Performs the t-tests of feature_analysis. Returns the sorted list of
+    ((feature, tag, larger cluster size, mean, std, merged clusters size,
+    mean, std), p-value) tuples.
+    '''
     # Number of columns is equal to number of features.
     assert feature_matrix.shape == (len(labels), len(feature_list))
     # Get the label of the most common cluster.
     max_clus = Counter(labels).most_common(1)[0][0]
-    # 'a' denotes the largest cluster.
-    max_clus_idx_lst = [i for i, e in enumerate(labels) if e == max_clus]
-    # Merge the smaller clusters.
-    merged_clus_idx_lst = [i for i, e in enumerate(labels) if e != max_clus]
+    # 'a' denotes the largest cluster, the smaller clusters are merged.
+    ttest = ttest_columns(feature_matrix, np.asarray(labels) == max_clus)
 
     # Maps features to p-values of t-tests for the two clusters.
     p_val_dct = {}
     for feature_idx, feature in enumerate(feature_list):
-        column = feature_matrix[:,feature_idx]
-        # This is the feature values for the larger cluster.
-        max_feat_list = column[max_clus_idx_lst]
-        assert len(max_feat_list) == len(max_clus_idx_lst)
-        # Feature values for merged clusters.
-        merged_feat_list = column[merged_clus_idx_lst]
-        assert len(max_feat_list) + len(merged_feat_list) == len(labels)
-        # Compute the unpaired t-test between the two samples of features.
-        with np.errstate(invalid='ignore'):
-            t_stat, p_value = ttest_ind(max_feat_list, merged_feat_list)
+        p_value = ttest.p_value[feature_idx]
         if np.isnan(p_value):
-            p_value = 1
-
+            p_value = 0.5
         # > marker means that largest cluster has a larger mean than the
-        # combined clusters.
-        max_mean, merge_mean = np.mean(max_feat_list), np.mean(merged_feat_list)
-        max_std, merge_std = np.std(max_feat_list), np.std(merged_feat_list)
-        # assert len(max_feat_list) > len(merged_feat_list)
-        if max_mean == merge_mean:
-            tag = '='
-        elif max_mean > merge_mean:
-            # Larger cluster gets label 1.
-            tag = '%d>' % 1
-        else:
-            tag = '<'
-        p_val_dct[(feature, tag, len(max_feat_list), max_mean, max_std,
-            len(merged_feat_list), merge_mean, merge_std)] = p_value / 2.0
+        # combined clusters. Larger cluster gets label 1.
+        tag = {0:'=', 1:'%d>' % 1, -1:'<'}[ttest.direction[feature_idx]]
+        p_val_dct[(feature, tag, ttest.count_a, ttest.mean_a[feature_idx],
+            ttest.std_a[feature_idx], ttest.count_b, ttest.mean_b[feature_idx],
+            ttest.std_b[feature_idx])] = p_value
+
+    return sorted(p_val_dct.items(), key=operator.itemgetter(1))
 
-    p_val_dct = sorted(p_val_dct.items(), key=operator.itemgetter(1))
+def format_feature_p_value(feature_p_val):
+    ((feature, tag, max_len, max_mean, max_std, merge_len, merge_mean,
+        merge_std), p_value) = feature_p_val
+    return '%s\t%g\t%d\t%g\t%g\t%d\t%g\t%g\t%s' % (feature, p_value, max_len,
+        max_mean, max_std, merge_len, merge_mean, merge_std, tag)
 
+def write_feature_p_values(p_val_dct, out_name, symp_line=''):
     # Write out to file.
     out = open(out_name, 'w')
     out.write(symp_line) # Write out the optional symptom line. Sequential only.
-    for ((feature, tag, max_len, max_mean, max_std, merge_len, merge_mean,
-        merge_std), p_value) in p_val_dct:
-        out.write('%s\t%g\t%d\t%g\t%g\t%d\t%g\t%g\t%s\n' % (feature, p_value,
-            max_len, max_mean, max_std, merge_len, merge_mean, merge_std, tag))
+    for feature_p_val in p_val_dct:
+        out.write('%s\n' % format_feature_p_value(feature_p_val))
     out.close()
 
-def sequential_cluster(feat_comb, args):
+def get_base_fname(args):
     '''
-    First split data by cancer subtype, and then sub-cluster on treatment
-    features.
+    Returns the name shared by the output files of a sweep.
     '''
-    if args.num_dim == None:
+    if args.latent:
+        return 'prosnet_%s_latent' % args.num_dim
+    elif args.num_dim != None:
+        return 'prosnet_%s_%s' % (args.num_dim, args.sim_thresh)
+    elif args.other_feat in ['mean', 'vkps']:
+        return args.other_feat
+    return 'raw'
+
+def load_sweep_data(feat_comb_list, args):
+    '''
+    Reads the feature matrices, the subtypes and the columns of every feature
+    type in feat_comb_list once, for all the jobs of a sweep. A latent matrix
+    is clustered on all its columns, and its feature analysis runs on the raw
+    matrix.
+    '''
+    if args.latent:
+        suffix = '_%s_latent' % args.num_dim
+    elif args.num_dim == None:
         suffix = '_raw'
     else:
-        assert args.num_dim.isdigit() and args.sim_thresh != None
         suffix = '_%s_%s' % (args.num_dim, args.sim_thresh)
 
-    feature_matrix, feature_list, survival_mat = read_feature_matrix(suffix)
+    feature_matrix, feature_list, survival_mat = read_feature_matrix(suffix,
+        dense=False)
     base_feature_matrix, base_feat_lst, base_surv_mat = read_feature_matrix(
         '_raw')
-    assert base_feat_lst == feature_list and survival_mat == base_surv_mat
+    assert survival_mat == base_surv_mat
+    if args.latent:
+        # The columns are ProSNet dimensions, not features.
+        col_idx_dct = {'latent':range(feature_matrix.shape[1])}
+        feature_list = base_feat_lst
+    else:
+        assert base_feat_lst == feature_list
+        col_idx_dct = {}
+        for feat_type in set(itertools.chain.from_iterable(feat_comb_list)):
+            if feat_type == 'VKPS':
+                col_idx_dct[feat_type] = [feature_list.index('VKPS')]
+            else:
+                col_idx_dct[feat_type] = get_col_idx_lst(feature_list,
+                    [feat_type])
 
     # First, only cluster on symptoms and tests for sequential clustering.
     subtype_labels = get_subtype_labels(survival_mat)
+    # Skip the 0th subtype, since it's in the 'other' category.
+    subtype_idx_dct = dict((i, [j for j, label in enumerate(subtype_labels) if
+        label == i]) for i in [1, 2])
 
-    # Get the sliced feature matrix, depending on the feat_comb.
-    if feat_comb == ['VKPS']:
-        feat_idx_lst = [feature_list.index('VKPS')]
+    return SweepData(feature_matrix, base_feature_matrix, feature_list,
+        survival_mat, subtype_idx_dct, col_idx_dct)
+
+def init_sweep_worker(data, args):
+    global sweep_data, sweep_args
+    sweep_data, sweep_args = data, args
+
+def cluster_subtype(job):
+    '''
+    Clusters the patients of one subtype on one feature combination. Reads
+    the global sweep_data. Returns a SweepResult.
+    '''
+    feat_comb, subtype, num_processes = job
+    # Columns of all feature types in the combination, in feature list order.
+    feat_idx_lst = sorted(set(itertools.chain.from_iterable(
+        sweep_data.col_idx_dct[feat_type] for feat_type in feat_comb)))
+    clus_idx_lst = sweep_data.subtype_idx_dct[subtype]
+    clus_feat_matrix = sweep_data.feature_matrix[:,feat_idx_lst][clus_idx_lst]
+    # Only the clustering itself works on sparse matrices.
+    if sweep_args.other_feat != None and issparse(clus_feat_matrix):
+        clus_feat_matrix = clus_feat_matrix.toarray()
+
+    # Use mean imputer according to the other_feat argument.
+    if sweep_args.other_feat == 'mean':
+        imp = Imputer(missing_values=0, strategy='mean')
+        clus_feat_matrix = imp.fit_transform(clus_feat_matrix)
+
+    if sweep_args.other_feat == 'vkps':
+        # One cluster of patients with cluster > 60, rest into the other.
+        sub_labels = [1 if kps > 60 else 0 for kps in clus_feat_matrix]
     else:
-        feat_idx_lst = get_col_idx_lst(feature_list, feat_comb)
-    sub_feature_matrix = feature_matrix[:,feat_idx_lst]
-    
-    # good_labels = [i for i, e in enumerate(subtype_labels) if e in [1,2]]
-    # num_zeros = 0.0
-    # for row in feature_matrix[good_labels]:
-    #     for ele in row:
-    #         if ele == 0:
-    #             num_zeros += 1
-    # print 'average number of zeros', num_zeros / float(feature_matrix[good_labels].shape[0])
-    # print 'feature matrix shape', feature_matrix[good_labels].shape
-    # # END TODO.
+        sub_labels = get_cluster_labels(clus_feat_matrix, sweep_args,
+            num_processes)
 
-    # Skip the 0th subtype, since it's in the 'other' category.
-    for i in [1, 2]:
-        # These are the indices of the patients with the current cancer subtype.
-        clus_idx_lst = [j for j, label in enumerate(subtype_labels) if label == i]
-        assert len(clus_idx_lst) == subtype_labels.count(i)
+    # Log-rank test between the largest cluster and the rest.
+    time_arr, event_arr = get_survival_arrays([sweep_data.survival_mat[j] for
+        j in clus_idx_lst])
+    chisq, p_value = logrank_test(time_arr, event_arr, get_cluster_tags(
+        sub_labels))
+    # Perform feature analysis on all features.
+    feature_p_val_lst = get_feature_p_values(sub_labels,
+        sweep_data.base_feature_matrix[clus_idx_lst], sweep_data.feature_list)
+    return SweepResult(feat_comb, subtype, sub_labels, chisq, p_value,
+        feature_p_val_lst)
 
-        clus_feat_matrix = sub_feature_matrix[clus_idx_lst]
+def write_sweep_tables(result_lst, base_fname):
+    '''
+    Writes one row per (feature combination, subtype) with the cluster sizes
+    and the log-rank test, and one row per feature analysis line.
+    '''
+    out = open('./results/cluster_sweep_%s.txt' % base_fname, 'w')
+    out.write('features\tsubtype\tlarge_size\tsmall_size\tchisq\tp_value\n')
+    for result in result_lst:
+        num_small = sum(get_cluster_tags(result.labels))
+        out.write('%s\t%d\t%d\t%d\t%g\t%g\n' % (','.join(result.feat_comb),
+            result.subtype, len(result.labels) - num_small, num_small,
+            result.chisq, result.p_value))
+    out.close()
 
-        # Use mean imputer according to the other_feat argument.
-        if args.other_feat == 'mean':
-            imp = Imputer(missing_values=0, strategy='mean')
-            clus_feat_matrix = imp.fit_transform(clus_feat_matrix)
+    out = open('%s/%s_sweep.txt' % (feat_folder, base_fname), 'w')
+    for result in result_lst:
+        for feature_p_val in result.feature_p_val_lst:
+            out.write('%s\t%d\t%s\n' % (','.join(result.feat_comb),
+                result.subtype, format_feature_p_value(feature_p_val)))
+    out.close()
 
-        if args.other_feat == 'vkps':
-            # sub_labels = get_vkps_labels(clus_feat_matrix)
-            # One cluster of patients with cluster > 60, rest into the other.
-            sub_labels = [1 if kps > 60 else 0 for kps in clus_feat_matrix]
-        else:
-            sub_labels = get_cluster_labels(clus_feat_matrix, args)
-        sub_survival_mat = [survival_mat[j] for j in clus_idx_lst]
-        # Handling different dataframe filenames.
-        if args.num_dim != None:
-            # sub_df_fname = '%s/prosnet_%d_%s_%s.txt' % (df_folder, i, args.num_dim, args.sim_thresh)
-            # sub_feat_fname = '%s/prosnet_%d_%s_%s.txt' % (feat_folder, i, args.num_dim, args.sim_thresh)
-            base_fname = 'prosnet_%s_%s' % (args.num_dim, args.sim_thresh)
-        elif args.other_feat in ['mean', 'vkps']:
-            base_fname = args.other_feat
-            # sub_df_fname = '%s/%s_%d.txt' % (df_folder, args.other_feat, i)
-            # sub_feat_fname = '%s/%s_%d.txt' % (feat_folder, args.other_feat, i)
-        else:
-            # sub_df_fname = '%s/raw_%d.txt' % (df_folder, i)
-            # sub_feat_fname = '%s/raw_%d.txt' % (feat_folder, i)
-            base_fname = 'raw'
-        sub_df_fname = '%s/%s_%d.txt' % (df_folder, base_fname, i)
-        sub_feat_fname = '%s/%s_%d.txt' % (feat_folder, base_fname, i)
+def write_sequential_files(result, base_fname, plot=False):
+    '''
+    Writes the dataframe and the feature p-values of one result, and prints
+    its survival summary, as sequential clustering did. Optionally plots the
+    Kaplan-Meier curves.
+    '''
+    sub_survival_mat = [sweep_data.survival_mat[j] for j in
+        sweep_data.subtype_idx_dct[result.subtype]]
+    sub_df_fname = '%s/%s_%d.txt' % (df_folder, base_fname, result.subtype)
+    sub_feat_fname = '%s/%s_%d.txt' % (feat_folder, base_fname,
+        result.subtype)
+    write_clusters(result.labels, sub_survival_mat, sub_df_fname)
+    write_feature_p_values(result.feature_p_val_lst, sub_feat_fname)
 
-        write_clusters(sub_labels, sub_survival_mat, sub_df_fname)
-        # Perform feature analysis on all features.
-        feature_analysis(sub_labels, base_feature_matrix[clus_idx_lst],
-            feature_list, sub_feat_fname)
+    time_arr, event_arr = get_survival_arrays(sub_survival_mat)
+    tag_arr = np.array(get_cluster_tags(result.labels))
+    print sub_df_fname
+    print result.chisq
+    print result.p_value
+    print_survival_summary(get_survival_summary(time_arr, event_arr, tag_arr))
+    if plot:
+        # Only plotting needs matplotlib.
+        from plot_kaplan_meiers import plot_kaplan_meiers
+        plot_kaplan_meiers(time_arr, event_arr, tag_arr,
+            '%s/%s_%d.pdf' % (plot_folder, base_fname, result.subtype))
 
-        # Call the R script.
-        command = 'Rscript plot_kaplan_meiers.R %s' % sub_df_fname
-        subprocess.call(command, shell=True)
+def sweep_clusters(feat_comb_list, args):
+    '''
+    Clusters both subtypes on every feature combination. With enough jobs,
+    they are spread across a process pool that shares the loaded data, and
+    each job's k-means runs in a single process. Otherwise, jobs run in turn
+    and their k-means restarts use the pool instead.
+    '''
+    init_sweep_worker(load_sweep_data(feat_comb_list, args), args)
+    job_lst = [(feat_comb, subtype) for feat_comb in feat_comb_list for
+        subtype in [1, 2]]
+    if len(job_lst) >= args.num_jobs > 1:
+        pool = multiprocessing.Pool(args.num_jobs)
+        result_lst = pool.map(cluster_subtype, [job + (1,) for job in
+            job_lst], 1)
+        pool.close()
+        pool.join()
+    else:
+        result_lst = [cluster_subtype(job + (None,)) for job in job_lst]
+
+    base_fname = get_base_fname(args)
+    write_sweep_tables(result_lst, base_fname)
+    for result in result_lst:
+        print '%s\t%d\tchisq %g\tp-value %g' % (','.join(result.feat_comb),
+            result.subtype, result.chisq, result.p_value)
+        if args.write_files:
+            write_sequential_files(result, base_fname, args.plot)
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-d', '--num_dim', help='Optional. Number of ProSNet dimensions.')
+    parser.add_argument('-d', '--num_dim', help='Optional. Number of ProSNet dimensions, or rwr for the random walk with restart enrichment.')
     parser.add_argument('-s', '--sim_thresh', help='Optional. Threshold for cosine similarity between ProSNet vectors. Required if --d is present.')
+    parser.add_argument('-l', '--latent', action='store_true', help='Optional. Cluster on all columns of feature_matrix_<dim>_latent, written by build_patient_feature_matrix.py -m latent. Requires -d, and replaces -s.')
     parser.add_argument('-o', '--other_feat', help='Optional. Either "mean" or "vkps". Cannot exist if -d exists.')
     parser.add_argument('-p', '--partial', help='Optional. Whether or not to use a subset of all features.')
+    parser.add_argument('-j', '--num_jobs', type=int, default=multiprocessing.cpu_count(), help='Optional. Number of processes. Sweep jobs run in parallel if there are at least this many, and otherwise the k-means restarts of each job do. Defaults to all CPUs.')
+    parser.add_argument('-e', '--patience', type=int, help='Optional. Stop the k-means restarts once the best inertia is unchanged for this many restarts.')
+    parser.add_argument('-c', '--comp_ratio', type=float, default=0.2, help='Optional. Number of principal components, as a fraction of the number of features.')
+    parser.add_argument('-w', '--write_files', action='store_true', help='Optional. Also write the per-subtype dataframes and feature p-values, and print their Kaplan-Meier summaries, as sequential clustering used to.')
+    parser.add_argument('-k', '--plot', action='store_true', help='Optional. With -w, also plot the Kaplan-Meier curves to ./results/survival_plots_seq.')
+    parser.add_argument('-b', '--memory_budget', type=int, default=2048, help='Optional. Largest in-memory patient distance matrix, in MB. Larger ones are memory-mapped in float32 and clustered in blocks.')
     args = parser.parse_args()
-    if args.num_dim != None:
+    if args.latent:
+        assert args.num_dim != None and args.num_dim.isdigit()
+        assert args.sim_thresh == None and args.other_feat == None
+        assert args.partial == None
+    elif args.num_dim != None:
         assert args.other_feat == None
-        assert args.num_dim.isdigit() and args.sim_thresh != None
+        assert (args.num_dim.isdigit() or args.num_dim == 'rwr') and (
+            args.sim_thresh != None)
     elif args.other_feat != None:
         assert args.num_dim == None
         assert args.other_feat in ['mean', 'vkps']
@@ -311,12 +423,9 @@ def main():
     generate_directories()
     args = parse_args()
 
-    feat_comb_list = get_feat_combination_list(args)
-
-    for feat_comb in feat_comb_list:
-        if feat_comb == ():
-            continue
-        sequential_cluster(list(feat_comb), args)
+    feat_comb_list = [list(feat_comb) for feat_comb in
+        get_feat_combination_list(args) if feat_comb != ()]
+    sweep_clusters(feat_comb_list, args)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
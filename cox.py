@@ -0,0 +1,223 @@
+### Author: Edward Huang
+
+from collections import namedtuple
+import numpy as np
+from scipy.stats import norm
+
+### Cox proportional hazards regression with Breslow's handling of ties, fit
+### by Newton-Raphson with step halving, as R's coxph. The patients are sorted
+### by time once, and every risk-set sum is a reversed cumulative sum read at
+### the first patient of each block of tied times. fit_cox_columns fits one
+### single-covariate model per column, all as array operations. fit_cox fits
+### one model on all columns, with an optional ridge penalty.
+
+# coef, std_err and p_value (Wald) have one entry per covariate. log_lik is
+# the (penalized) log partial likelihood, and num_iter the number of Newton
+# iterations and step halvings, both per model for fit_cox_columns.
+CoxModel = namedtuple('CoxModel', ['coef', 'std_err', 'p_value', 'log_lik',
+    'num_iter'])
+
+def get_risk_sets(time_arr, event_arr):
+    '''
+    Returns the order that sorts the patients by time, the position of the
+    first patient of each block of tied times in that order, and the number
+    of deaths in each block.
+    '''
+    time_arr = np.asarray(time_arr, dtype=np.float64)
+    order = np.argsort(time_arr, kind='mergesort')
+    start_arr = np.unique(time_arr[order], return_index=True)[1]
+    death_arr = np.add.reduceat(np.asarray(event_arr, dtype=np.float64)[order],
+        start_arr)
+    return order, start_arr, death_arr
+
+def get_risk_set_sums(value_matrix, start_arr):
+    # Sum over the patients with time >= each block's time.
+    return np.cumsum(value_matrix[::-1], axis=0)[::-1][start_arr]
+
+def get_univariate_terms(x_matrix, event_arr, start_arr, death_arr, coef):
+    '''
+    Returns the log partial likelihood, score and information of each column
+    of x_matrix at its coefficient in coef.
+    '''
+    eta_matrix = x_matrix * coef
+    # Shift each column for the exponentials, and add it back in the log.
+    eta_max = eta_matrix.max(axis=0)
+    weight_matrix = np.exp(eta_matrix - eta_max)
+    s0 = get_risk_set_sums(weight_matrix, start_arr)
+    s1 = get_risk_set_sums(weight_matrix * x_matrix, start_arr)
+    s2 = get_risk_set_sums(weight_matrix * x_matrix * x_matrix, start_arr)
+
+    is_death = death_arr > 0
+    death_weight = death_arr[is_death][:, np.newaxis]
+    s0, s1, s2 = s0[is_death], s1[is_death], s2[is_death]
+    mean_matrix = s1 / s0
+    log_lik = eta_matrix[event_arr].sum(axis=0) - (death_weight * (np.log(s0) +
+        eta_max)).sum(axis=0)
+    score = x_matrix[event_arr].sum(axis=0) - (death_weight * mean_matrix).sum(
+        axis=0)
+    info = (death_weight * (s2 / s0 - mean_matrix ** 2)).sum(axis=0)
+    return log_lik, score, info
+
+def fit_cox_columns(x_matrix, time_arr, event_arr, max_iter=20, tol=1e-9):
+    '''
+    Fits the model h(t) = h0(t) exp(b x) for every column x of x_matrix
+    (patients by covariates) at once. Each column counts its own iterations,
+    step halvings included, and stops once its relative change in
+    log-likelihood is below tol. Columns whose likelihood is monotone (e.g.
+    all deaths on one side of a split) drift until max_iter, as in coxph.
+    num_iter is per column.
+    '''
+    order, start_arr, death_arr = get_risk_sets(time_arr, event_arr)
+    x_matrix = np.asarray(x_matrix, dtype=np.float64)[order]
+    # Centering leaves the coefficients unchanged, and keeps exp in range.
+    x_matrix = x_matrix - x_matrix.mean(axis=0)
+    event_arr = np.asarray(event_arr, dtype=bool)[order]
+
+    coef = np.zeros(x_matrix.shape[1])
+    num_iter = np.zeros(x_matrix.shape[1], dtype=int)
+    log_lik, score, info = get_univariate_terms(x_matrix, event_arr,
+        start_arr, death_arr, coef)
+    is_active = (info > 0) & (num_iter < max_iter)
+    while is_active.any():
+        num_iter[is_active] += 1
+        step = np.zeros(len(coef))
+        step[is_active] = score[is_active] / info[is_active]
+        new_log_lik, new_score, new_info = get_univariate_terms(x_matrix,
+            event_arr, start_arr, death_arr, coef + step)
+        # Halve the steps that lowered the likelihood, while their columns
+        # have iterations left.
+        is_worse = is_active & ~(new_log_lik >= log_lik)
+        while (is_worse & (num_iter < max_iter)).any():
+            is_halving = is_worse & (num_iter < max_iter)
+            num_iter[is_halving] += 1
+            step[is_halving] /= 2.0
+            new_log_lik, new_score, new_info = get_univariate_terms(x_matrix,
+                event_arr, start_arr, death_arr, coef + step)
+            is_worse &= ~(new_log_lik >= log_lik)
+
+        # Only take the steps that did not lower the likelihood.
+        is_taken = is_active & ~is_worse
+        with np.errstate(invalid='ignore', divide='ignore'):
+            is_converged = np.abs(1 - new_log_lik / log_lik) <= tol
+        coef[is_taken] += step[is_taken]
+        log_lik = np.where(is_taken, new_log_lik, log_lik)
+        score = np.where(is_taken, new_score, score)
+        info = np.where(is_taken, new_info, info)
+        is_active &= is_taken & ~is_converged & (info > 0) & (num_iter <
+            max_iter)
+
+    with np.errstate(divide='ignore'):
+        std_err = 1 / np.sqrt(info)
+    return CoxModel(coef, std_err, 2 * norm.sf(np.abs(coef / std_err)),
+        log_lik, num_iter)
+
+def get_multivariate_terms(x_matrix, event_arr, start_arr, death_arr, coef,
+    ridge):
+    '''
+    Returns the penalized log partial likelihood and score at coef, and the
+    n x n matrix H such that the unpenalized information is X^T H X. H is
+    diag(c), the patients' weights times the Breslow hazard up to their
+    times, minus one outer product per event time.
+    '''
+    eta_arr = np.dot(x_matrix, coef)
+    eta_max = eta_arr.max()
+    weight_arr = np.exp(eta_arr - eta_max)
+    s0 = get_risk_set_sums(weight_arr, start_arr)
+    s1 = get_risk_set_sums(weight_arr[:, np.newaxis] * x_matrix, start_arr)
+
+    is_death = death_arr > 0
+    death_weight, s0, s1 = death_arr[is_death], s0[is_death], s1[is_death]
+    log_lik = eta_arr[event_arr].sum() - np.dot(death_weight, np.log(s0) +
+        eta_max) - 0.5 * ridge * np.dot(coef, coef)
+    score = x_matrix[event_arr].sum(axis=0) - np.dot(death_weight, s1 / s0[
+        :, np.newaxis]) - ridge * coef
+
+    block_hazard = np.zeros(len(start_arr))
+    block_hazard[is_death] = death_weight / s0
+    block_size = np.diff(np.append(start_arr, len(eta_arr)))
+    patient_hazard = np.repeat(np.cumsum(block_hazard), block_size)
+    # Row k of risk_matrix holds the weights of event time k's risk set, so
+    # that its mean covariates are risk_matrix X.
+    is_at_risk = np.arange(len(eta_arr)) >= start_arr[is_death][:,
+        np.newaxis]
+    risk_matrix = is_at_risk * weight_arr / s0[:, np.newaxis]
+    hess_matrix = np.dot(risk_matrix.T * death_weight, -risk_matrix)
+    hess_matrix[np.diag_indices_from(hess_matrix)] += weight_arr * (
+        patient_hazard)
+    return log_lik, score, hess_matrix
+
+def is_wide(x_matrix, ridge):
+    # Wide penalized problems are solved in patient space.
+    return ridge > 0 and x_matrix.shape[1] > x_matrix.shape[0]
+
+def get_newton_step(x_matrix, hess_matrix, ridge, score):
+    '''
+    Solves (X^T H X + ridge I) step = score. Wide matrices use the Woodbury
+    identity, with an n x n solve instead of a p x p one.
+    '''
+    if is_wide(x_matrix, ridge):
+        inner_matrix = np.dot(np.dot(x_matrix, x_matrix.T), hess_matrix)
+        inner_matrix[np.diag_indices_from(inner_matrix)] += ridge
+        return (score - np.dot(x_matrix.T, np.dot(hess_matrix, np.linalg.solve(
+            inner_matrix, np.dot(x_matrix, score))))) / ridge
+    info = np.dot(x_matrix.T, np.dot(hess_matrix, x_matrix))
+    info[np.diag_indices_from(info)] += ridge
+    return np.linalg.lstsq(info, score, rcond=None)[0]
+
+def get_std_err(x_matrix, hess_matrix, ridge):
+    '''
+    Returns the square roots of the diagonal of the inverse penalized
+    information, by the Woodbury identity for wide matrices.
+    '''
+    if is_wide(x_matrix, ridge):
+        inner_matrix = np.dot(np.dot(x_matrix, x_matrix.T), hess_matrix)
+        inner_matrix[np.diag_indices_from(inner_matrix)] += ridge
+        solved_matrix = np.dot(hess_matrix, np.linalg.solve(inner_matrix,
+            x_matrix))
+        return np.sqrt((1 - (x_matrix * solved_matrix).sum(axis=0)) / ridge)
+    info = np.dot(x_matrix.T, np.dot(hess_matrix, x_matrix))
+    info[np.diag_indices_from(info)] += ridge
+    return np.sqrt(np.diag(np.linalg.pinv(info)))
+
+def fit_cox(x_matrix, time_arr, event_arr, ridge=0.0, max_iter=50, tol=1e-9):
+    '''
+    Fits one model on all columns of x_matrix (patients by covariates), with
+    the penalty ridge / 2 * ||b||^2 on the coefficients. A positive ridge
+    keeps wide matrices, with more features than patients, solvable, and
+    their Newton steps then cost O(n^2 p) instead of O(p^3). Without a ridge,
+    or with fewer features than patients, each step solves the p x p
+    information matrix. Wide matrices need more step halvings than coxph's 20
+    iterations allow when the ridge is small.
+    '''
+    order, start_arr, death_arr = get_risk_sets(time_arr, event_arr)
+    x_matrix = np.asarray(x_matrix, dtype=np.float64)[order]
+    x_matrix = x_matrix - x_matrix.mean(axis=0)
+    event_arr = np.asarray(event_arr, dtype=bool)[order]
+
+    coef = np.zeros(x_matrix.shape[1])
+    log_lik, score, hess_matrix = get_multivariate_terms(x_matrix, event_arr,
+        start_arr, death_arr, coef, ridge)
+    num_iter = 0
+    while num_iter < max_iter:
+        num_iter += 1
+        step = get_newton_step(x_matrix, hess_matrix, ridge, score)
+        new_log_lik, new_score, new_hess_matrix = get_multivariate_terms(
+            x_matrix, event_arr, start_arr, death_arr, coef + step, ridge)
+        # Halve the step while it lowers the likelihood.
+        while not new_log_lik >= log_lik and num_iter < max_iter:
+            num_iter += 1
+            step /= 2.0
+            new_log_lik, new_score, new_hess_matrix = get_multivariate_terms(
+                x_matrix, event_arr, start_arr, death_arr, coef + step, ridge)
+        # Never take a step that lowered the likelihood.
+        if not new_log_lik >= log_lik:
+            break
+        is_converged = abs(1 - new_log_lik / log_lik) <= tol
+        coef += step
+        log_lik, score, hess_matrix = new_log_lik, new_score, new_hess_matrix
+        if is_converged:
+            break
+
+    std_err = get_std_err(x_matrix, hess_matrix, ridge)
+    return CoxModel(coef, std_err, 2 * norm.sf(np.abs(coef / std_err)),
+        log_lik, num_iter)
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+### Author: Edward Huang
+
+import argparse
+from cluster_cancer_subtypes import get_subtype_labels
+from collections import namedtuple
+from cox import fit_cox
+from file_operations import read_feature_matrix
+import multiprocessing
+import numpy as np
+from survival import concordance_index, get_survival_arrays
+from survival import time_dependent_auc
+
+### Repeated, stratified k-fold cross-validation of ridge Cox models on the
+### feature matrices, replacing the fold loop of cox_regression.R. Folds are
+### stratified by cancer subtype. Every (matrix, repeat, fold) is a job, and
+### jobs run in a process pool that shares the loaded matrices read-only.
+### Each fold reports Harrell's C-index and the time-dependent AUC of the test
+### patients' linear predictors.
+### Usage: python cross_validate_survival.py -m raw 500_0.3
+
+# Everything the folds read, loaded once. matrix_dct maps matrix names to
+# feature matrices. fold_matrix holds each patient's fold, one row per repeat.
+CVData = namedtuple('CVData', ['matrix_dct', 'time_arr', 'event_arr',
+    'fold_matrix', 'eval_time_arr'])
+FoldResult = namedtuple('FoldResult', ['matrix', 'repeat', 'fold', 'c_index',
+    'iauc', 'auc_arr'])
+
+def get_fold_matrix(strata_lst, num_folds, num_repeats, seed=9305):
+    '''
+    Assigns the patients to folds, once per repeat. Each stratum is shuffled
+    and dealt out across the folds, so every fold gets its share of every
+    stratum.
+    '''
+    strata_arr = np.array(strata_lst)
+    rand = np.random.RandomState(seed)
+    fold_matrix = np.zeros((num_repeats, len(strata_arr)), dtype=int)
+    for repeat in range(num_repeats):
+        # Start each stratum at a random fold, so that the remainders spread.
+        offset = rand.randint(num_folds)
+        for stratum in np.unique(strata_arr):
+            idx_arr = rand.permutation(np.flatnonzero(strata_arr == stratum))
+            fold_matrix[repeat, idx_arr] = (np.arange(len(idx_arr)) + offset
+                ) % num_folds
+            offset = (offset + len(idx_arr)) % num_folds
+    return fold_matrix
+
+def load_cv_data(args):
+    '''
+    Reads every matrix, and checks that they describe the same patients.
+    '''
+    matrix_dct, survival_mat = {}, None
+    for matrix_name in args.matrices:
+        feature_matrix, feature_list, matrix_survival_mat = (
+            read_feature_matrix('_%s' % matrix_name))
+        assert survival_mat == None or matrix_survival_mat == survival_mat
+        matrix_dct[matrix_name], survival_mat = feature_matrix, (
+            matrix_survival_mat)
+    time_arr, event_arr = get_survival_arrays(survival_mat)
+    fold_matrix = get_fold_matrix(get_subtype_labels(survival_mat),
+        args.num_folds, args.repeats)
+    eval_time_arr = np.arange(args.eval_step, args.max_time + args.eval_step /
+        2.0, args.eval_step)
+    return CVData(matrix_dct, time_arr, event_arr, fold_matrix, eval_time_arr)
+
+def init_cv_worker(data, args):
+    global cv_data, cv_args
+    cv_data, cv_args = data, args
+
+def evaluate_fold(job):
+    '''
+    Fits a ridge Cox model on all but one fold of a matrix, and scores the
+    held-out fold. The columns are standardized by the training fold's means
+    and standard deviations, so that the ridge penalizes every feature alike,
+    and the test fold gets the same transform. Reads the global cv_data.
+    Returns a FoldResult.
+    '''
+    matrix_name, repeat, fold = job
+    is_test = cv_data.fold_matrix[repeat] == fold
+    feature_matrix = cv_data.matrix_dct[matrix_name]
+    train_time_arr = cv_data.time_arr[~is_test]
+    train_event_arr = cv_data.event_arr[~is_test]
+
+    train_matrix = np.array(feature_matrix[~is_test], dtype=np.float64)
+    mean_arr, std_arr = train_matrix.mean(axis=0), train_matrix.std(axis=0)
+    # Constant columns are only centered.
+    std_arr[std_arr == 0] = 1
+    train_matrix -= mean_arr
+    train_matrix /= std_arr
+    model = fit_cox(train_matrix, train_time_arr, train_event_arr,
+        ridge=cv_args.ridge)
+    risk_arr = np.dot((feature_matrix[is_test] - mean_arr) / std_arr,
+        model.coef)
+    auc_arr, iauc = time_dependent_auc(train_time_arr, train_event_arr,
+        cv_data.time_arr[is_test], cv_data.event_arr[is_test], risk_arr,
+        cv_data.eval_time_arr)
+    return FoldResult(matrix_name, repeat, fold, concordance_index(
+        cv_data.time_arr[is_test], cv_data.event_arr[is_test], risk_arr),
+        iauc, auc_arr)
+
+def get_fold_bytes(num_patients, num_features):
+    '''
+    Estimates the memory one fold's fit takes: a few copies of the training
+    matrix, the patients' n x n Hessian and its solves, and the information
+    matrix, which is n x n for wide matrices and p x p otherwise.
+    '''
+    return 8 * (4 * num_patients * num_features + 3 * num_patients ** 2 + 2 *
+        min(num_patients, num_features) ** 2)
+
+def get_num_jobs(data, args):
+    '''
+    Caps args.num_jobs so that the concurrent fits stay within
+    args.memory_budget MB, by the widest matrix.
+    '''
+    fold_bytes = max(get_fold_bytes(len(data.time_arr), feature_matrix.shape[1])
+        for feature_matrix in data.matrix_dct.values())
+    num_jobs = min(args.num_jobs, max(1, args.memory_budget * 1024 ** 2 //
+        fold_bytes))
+    if num_jobs < args.num_jobs:
+        print 'Running %d processes to stay within %d MB.' % (num_jobs,
+            args.memory_budget)
+    return num_jobs
+
+def write_results(result_lst, eval_time_arr):
+    '''
+    Writes one row per fold, and prints the mean and standard deviation of
+    each matrix's scores over all folds.
+    '''
+    out = open('./results/cross_validation.txt', 'w')
+    out.write('matrix\trepeat\tfold\tc_index\tiauc\t%s\n' % '\t'.join(
+        'auc_%g' % eval_time for eval_time in eval_time_arr))
+    for result in result_lst:
+        out.write('%s\t%d\t%d\t%g\t%g\t%s\n' % (result.matrix, result.repeat,
+            result.fold, result.c_index, result.iauc, '\t'.join('%g' % auc
+            for auc in result.auc_arr)))
+    out.close()
+
+    print 'matrix\tc_index\tc_index_std\tiauc\tiauc_std'
+    for matrix_name in sorted(set(result.matrix for result in result_lst)):
+        c_index_arr, iauc_arr = np.array([(result.c_index, result.iauc) for
+            result in result_lst if result.matrix == matrix_name]).T
+        print '%s\t%.4f\t%.4f\t%.4f\t%.4f' % (matrix_name, np.nanmean(
+            c_index_arr), np.nanstd(c_index_arr), np.nanmean(iauc_arr),
+            np.nanstd(iauc_arr))
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--matrices', nargs='+', default=['raw'], help='Optional. Feature matrices to compare, by suffix, e.g. raw 500_0.3 rwr_0.001_k50.')
+    parser.add_argument('-k', '--num_folds', type=int, default=3, help='Optional. Number of folds.')
+    parser.add_argument('-r', '--repeats', type=int, default=10, help='Optional. Number of times to reshuffle the folds.')
+    parser.add_argument('-l', '--ridge', type=float, default=1.0, help='Optional. Ridge penalty of the Cox models.')
+    parser.add_argument('-e', '--eval_step', type=float, default=5, help='Optional. Months between AUC evaluation times.')
+    parser.add_argument('-t', '--max_time', type=float, default=50, help='Optional. Last AUC evaluation time, in months.')
+    parser.add_argument('-j', '--num_jobs', type=int, default=multiprocessing.cpu_count(), help='Optional. Number of processes. Defaults to all CPUs, capped by -b.')
+    parser.add_argument('-b', '--memory_budget', type=int, default=2048, help='Optional. Memory the concurrent fits may take, in MB. Caps the number of processes for wide matrices.')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    init_cv_worker(load_cv_data(args), args)
+    num_jobs = get_num_jobs(cv_data, args)
+    job_lst = [(matrix_name, repeat, fold) for matrix_name in args.matrices
+        for repeat in range(args.repeats) for fold in range(args.num_folds)]
+    if num_jobs > 1:
+        # Workers inherit cv_data when the pool forks.
+        pool = multiprocessing.Pool(num_jobs)
+        result_lst = pool.map(evaluate_fold, job_lst, 1)
+        pool.close()
+        pool.join()
+    else:
+        result_lst = map(evaluate_fold, job_lst)
+    write_results(result_lst, cv_data.eval_time_arr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+### Author: Edward Huang
+
+from collections import namedtuple
+from disk_cache import get_cache_key, load_entry, store_entry
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.decomposition import PCA
+from sklearn.utils.extmath import svd_flip
+
+### PCA for the clustering scripts. Dense matrices use sklearn's PCA. Sparse
+### matrices use a randomized SVD that centers the columns implicitly, so they
+### are never densified. Decompositions are memoized in the disk cache, keyed
+### by a hash of the input matrix and the number of components.
+
+Decomposition = namedtuple('Decomposition', ['transformed_matrix',
+    'explained_variance_ratio'])
+
+def get_matrix_hash(data_matrix):
+    '''
+    Returns the MD5 hex digest of a dense or sparse matrix's shape and values.
+    Sparse matrices are hashed in canonical CSR form.
+    '''
+    md5 = hashlib.md5()
+    md5.update(repr(data_matrix.shape))
+    if issparse(data_matrix):
+        data_matrix = csr_matrix(data_matrix, dtype=np.float64, copy=True)
+        data_matrix.sum_duplicates()
+        data_matrix.sort_indices()
+        md5.update(data_matrix.indptr.astype(np.int64).tostring())
+        md5.update(data_matrix.indices.astype(np.int64).tostring())
+        md5.update(data_matrix.data.tostring())
+    else:
+        md5.update(np.ascontiguousarray(data_matrix, dtype=np.float64
+            ).tostring())
+    return md5.hexdigest()
+
+def get_centered_product(data_matrix, col_mean, right_matrix):
+    # (X - 1 mu^T) R, without forming the centered matrix.
+    return data_matrix.dot(right_matrix) - np.dot(col_mean, right_matrix)
+
+def get_centered_rproduct(data_matrix, col_mean, left_matrix):
+    # (X - 1 mu^T)^T L.
+    return data_matrix.T.dot(left_matrix) - np.outer(col_mean,
+        left_matrix.sum(axis=0))
+
+def sparse_pca(data_matrix, n_components, random_state=930519,
+    n_oversamples=10, n_iter=None):
+    '''
+    Randomized SVD of the column-centered sparse matrix, with QR-normalized
+    power iterations (Halko et al.). Returns the principal component scores
+    U S and the variance each component explains.
+    '''
+    data_matrix = csr_matrix(data_matrix, dtype=np.float64)
+    num_rows, num_cols = data_matrix.shape
+    if n_iter == None:
+        # Same rule as sklearn's randomized_svd.
+        n_iter = 7 if n_components < 0.1 * min(num_rows, num_cols) else 4
+    col_mean = np.asarray(data_matrix.mean(axis=0)).ravel()
+    num_samples = min(n_components + n_oversamples, num_rows, num_cols)
+
+    rand = np.random.RandomState(random_state)
+    range_matrix = get_centered_product(data_matrix, col_mean, rand.normal(
+        size=(num_cols, num_samples)))
+    range_matrix = np.linalg.qr(range_matrix)[0]
+    for i in range(n_iter):
+        range_matrix = np.linalg.qr(get_centered_rproduct(data_matrix,
+            col_mean, range_matrix))[0]
+        range_matrix = np.linalg.qr(get_centered_product(data_matrix,
+            col_mean, range_matrix))[0]
+    # Project onto the range, and take the SVD of the small matrix.
+    small_matrix = get_centered_rproduct(data_matrix, col_mean,
+        range_matrix).T
+    small_u, singular_values, v_matrix = np.linalg.svd(small_matrix,
+        full_matrices=False)
+    u_matrix, v_matrix = svd_flip(np.dot(range_matrix, small_u), v_matrix)
+    u_matrix = u_matrix[:, :n_components]
+    singular_values = singular_values[:n_components]
+
+    # Total variance is the sum of the column variances.
+    col_sq_mean = np.asarray(data_matrix.multiply(data_matrix).mean(axis=0)
+        ).ravel()
+    total_var = np.sum(col_sq_mean - col_mean ** 2) * num_rows / (num_rows - 1)
+    explained_variance = singular_values ** 2 / (num_rows - 1)
+    return u_matrix * singular_values, explained_variance / total_var
+
+def print_explained_variance(explained_variance_ratio):
+    '''
+    Prints the variance explained by all components, and how many components
+    are needed for a few fractions of the variance.
+    '''
+    cum_ratio = np.cumsum(explained_variance_ratio)
+    print 'PCA: %d components explain %.1f%% of the variance' % (len(
+        cum_ratio), 100 * cum_ratio[-1] if len(cum_ratio) else 0)
+    for frac in (0.5, 0.8, 0.9):
+        if len(cum_ratio) and cum_ratio[-1] >= frac:
+            print '    %d%% of the variance at %d components' % (100 * frac,
+                np.searchsorted(cum_ratio, frac) + 1)
+
+def pca_transform(data_matrix, n_components, random_state=930519,
+    use_cache=True):
+    '''
+    Projects data_matrix onto its first n_components principal components.
+    Sparse matrices go through sparse_pca, dense ones through PCA. Returns a
+    Decomposition, which is cached on disk.
+    '''
+    key = get_cache_key('decomposition.pca_transform', (get_matrix_hash(
+        data_matrix), n_components, random_state, issparse(data_matrix)), [])
+    is_hit, decomposition = load_entry(key) if use_cache else (False, None)
+    if not is_hit:
+        if issparse(data_matrix):
+            decomposition = Decomposition(*sparse_pca(data_matrix,
+                n_components, random_state))
+        else:
+            pca = PCA(n_components=n_components, random_state=random_state)
+            decomposition = Decomposition(pca.fit_transform(data_matrix),
+                pca.explained_variance_ratio_)
+        if use_cache:
+            store_entry(key, decomposition)
+    print_explained_variance(decomposition.explained_variance_ratio)
+    return decomposition
@@ -7,16 +7,16 @@ from file_operations import read_feature_matrix, read_spreadsheet
 import numpy as np
 import os
 import shutil
-import subprocess
+from survival import summarize_dataframe_folder
 import sys
 import time
 
 # This script takes the feature matrix, and, depending on the argument, uses
-# a set of features to cluster the patients, then calls the R script to plot
-# the survival models.
+# a set of features to cluster the patients, then runs the log-rank test and
+# the Kaplan-Meier summaries of each clustering.
 
 def generate_directories():
-    global df_folder
+    global df_folder, plot_folder
     df_folder = './data/patient_dataframes_%s' % plot_type
     plot_folder = './results/survival_plots_%s' % plot_type
     if isProsnet:
@@ -123,9 +123,9 @@ def main():
 
     # Cluster the patients.
     write_clusters()
-    # Call the R script.
-    command = 'Rscript survival_model.R %s' % df_folder
-    subprocess.call(command, shell=True)
+    # Log-rank tests and Kaplan-Meier summaries of every dataframe.
+    summarize_dataframe_folder(df_folder, '%s/survival_summary.txt' %
+        plot_folder)
 
 if __name__ == '__main__':
     start_time = time.time()
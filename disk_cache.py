@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+### Author: Edward Huang
+
+import cPickle as pickle
+from functools import wraps
+import hashlib
+import os
+
+### On-disk cache for parsed data files. An entry is keyed by the reader name,
+### its arguments and the content hashes of its source files, so editing a
+### source file invalidates every entry built from it. Once the cache grows
+### past CACHE_MAX_BYTES, least recently used entries are evicted.
+
+CACHE_FOLDER = './data/cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Bump this whenever a cached reader changes its output format.
+CACHE_VERSION = 1
+
+# Maps (fname, mtime, size) to the content hash, so each source file is only
+# hashed once per process.
+file_hash_memo = {}
+
+def get_file_hash(fname):
+    '''
+    Returns the MD5 hex digest of a file's contents.
+    '''
+    stat = os.stat(fname)
+    memo_key = (os.path.abspath(fname), stat.st_mtime, stat.st_size)
+    if memo_key not in file_hash_memo:
+        md5 = hashlib.md5()
+        f = open(fname, 'rb')
+        for chunk in iter(lambda: f.read(1024 ** 2), ''):
+            md5.update(chunk)
+        f.close()
+        file_hash_memo[memo_key] = md5.hexdigest()
+    return file_hash_memo[memo_key]
+
+def get_cache_key(name, args, source_fname_list):
+    '''
+    Builds the key for a cache entry from the name of the computation, its
+    arguments, and the paths and contents of its source files.
+    '''
+    md5 = hashlib.md5()
+    md5.update('%d\t%s\t%r' % (CACHE_VERSION, name, args))
+    for fname in source_fname_list:
+        md5.update('\t%s\t%s' % (os.path.normpath(fname), get_file_hash(fname)))
+    return md5.hexdigest()
+
+def get_entry_fname(key):
+    return '%s/%s.pkl' % (CACHE_FOLDER, key)
+
+def load_entry(key):
+    '''
+    Returns (True, value) on a cache hit and (False, None) on a miss. A hit
+    refreshes the entry's modification time, which LRU eviction uses.
+    '''
+    entry_fname = get_entry_fname(key)
+    try:
+        f = open(entry_fname, 'rb')
+    except IOError:
+        return False, None
+    try:
+        value = pickle.load(f)
+    except Exception:
+        # Truncated or stale entry. Treat as a miss.
+        f.close()
+        return False, None
+    f.close()
+    os.utime(entry_fname, None)
+    return True, value
+
+def store_entry(key, value):
+    '''
+    Writes a cache entry, then evicts old entries if the cache is too large.
+    Writes go to a temporary file first, so concurrent readers never see a
+    partial entry.
+    '''
+    if not os.path.exists(CACHE_FOLDER):
+        os.makedirs(CACHE_FOLDER)
+    entry_fname = get_entry_fname(key)
+    tmp_fname = '%s.%d.tmp' % (entry_fname, os.getpid())
+    out = open(tmp_fname, 'wb')
+    pickle.dump(value, out, pickle.HIGHEST_PROTOCOL)
+    out.close()
+    os.rename(tmp_fname, entry_fname)
+    evict_entries(CACHE_MAX_BYTES)
+
+def evict_entries(max_bytes):
+    '''
+    Deletes least recently used entries until the cache fits in max_bytes.
+    '''
+    entry_lst = []
+    for fname in os.listdir(CACHE_FOLDER):
+        if not fname.endswith('.pkl'):
+            continue
+        try:
+            stat = os.stat('%s/%s' % (CACHE_FOLDER, fname))
+        except OSError:
+            continue
+        entry_lst += [(stat.st_mtime, stat.st_size, fname)]
+    total_bytes = sum(size for (mtime, size, fname) in entry_lst)
+    for (mtime, size, fname) in sorted(entry_lst):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove('%s/%s' % (CACHE_FOLDER, fname))
+        except OSError:
+            pass
+        total_bytes -= size
+
+def cached_reader(get_source_fname_list):
+    '''
+    Decorator that caches a file reader's return value on disk.
+    get_source_fname_list takes the reader's arguments and returns the list of
+    files the output depends on.
+    '''
+    def decorator(reader):
+        @wraps(reader)
+        def cached(*args):
+            source_fname_list = get_source_fname_list(*args)
+            key = get_cache_key('%s.%s' % (reader.__module__,
+                reader.__name__), args, source_fname_list)
+            is_hit, value = load_entry(key)
+            if not is_hit:
+                value = reader(*args)
+                store_entry(key, value)
+            return value
+        return cached
+    return decorator
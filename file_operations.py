@@ -4,9 +4,22 @@
 ### These functions are shared in a variety of scripts. Most are typically
 ### functions that read files.
 
-from collections import OrderedDict
+from array import array
+from collections import namedtuple, OrderedDict
+from disk_cache import cached_reader
 import numpy as np
+import os
+import re
+from scipy.sparse import load_npz
 
+# Compact form of a parsed spreadsheet. Row k of the spreadsheet contributes
+# the triplet (patient_idx[k], feature_idx[k], value[k]), where the indices
+# point into patient_list and feature_list. Both lists are ordered by first
+# appearance in the file.
+SpreadsheetTriplets = namedtuple('SpreadsheetTriplets', ['patient_list',
+    'feature_list', 'patient_idx', 'feature_idx', 'value'])
+
+@cached_reader(lambda: ['./data/cancer_caseinfo.txt'])
 def read_case_info():
     '''
     Get only the inhospital_id values that correspond to a first-time visit.
@@ -23,6 +36,164 @@ def read_case_info():
     f.close()
     return first_time_id_list
 
+def get_first_visit_set():
+    '''
+    Hash-indexed version of read_case_info for membership tests. The case info
+    file is only parsed again when its disk cache entry is stale.
+    '''
+    return frozenset(read_case_info())
+
+def parse_life_days_line(line):
+    # Survival events. Output binary labels, along with the event length.
+    assert len(line) == 7
+    inhospital_id, feature, feature_freq  = line[0], line[3], line[6]
+    if '死亡' in feature: # 1 is death. 0 is unknown.
+        feature = 1
+    else:
+        feature = 0
+    feature_freq = float(feature_freq) / 30.0 # Convert to months.
+    return inhospital_id, feature, feature_freq
+
+def parse_herbmed_line(line):
+    assert len(line) == 4
+    inhospital_id, feature_freq, feature = line[:3]
+    return inhospital_id, feature, feature_freq
+
+def parse_mr_symp_line(line):
+    assert len(line) == 3
+    inhospital_id, feature, feature_freq = line
+    return inhospital_id, feature, feature_freq
+
+def parse_syndromes_line(line):
+    assert len(line) == 3
+    return line[1], line[2], 1
+
+# def parse_incase_check_line(line):
+#     assert len(line) == 9
+#     inhospital_id, feature, feature_freq = line[0], line[3], line[4]
+#     # Skip negative tests.
+#     # TODO: good results with without cost condition.
+#     if feature_freq in ['无', '否', '没有'] or '费' in feature or (feature
+#         in ['住院天数', '阴影部位', '影像学诊断类型']):
+#         return None
+#     elif '级' in feature_freq:
+#         feature_freq = feature_freq[:feature_freq.index('级')]
+#     try:
+#         feature_freq = float(feature_freq)
+#         # Skip 0 features.
+#         if feature_freq == 0.0:
+#             return None
+#     except:
+#         feature_freq = 1
+#     return inhospital_id, feature, feature_freq
+
+def parse_check_line(line):
+    if len(line) != 9:
+        return None
+    inhospital_id, feature, feature_freq = line[0], line[6], line[8]
+    if feature_freq == '有':
+        feature_freq = 1
+    elif feature_freq == '无':
+        return None
+    elif '级' in feature_freq:
+        feature_freq = feature_freq[:feature_freq.index('级')]
+    try:
+        feature_freq = float(feature_freq)
+    except:
+        # TODO: What to do with unfloatable things.
+        # feature_freq = 1
+        return None
+    return inhospital_id, feature, feature_freq
+
+def parse_drug_line(line):
+    assert len(line) == 10
+    return line[0], line[1], line[4]
+
+def parse_caseinfo_line(line):
+    # TODO: Currently adding in senior citizen status.
+    assert len(line) == 7
+    inhospital_id, feature, feature_freq = line[0], 'senior', line[6]
+    if int(feature_freq) >= 65:
+        return inhospital_id, feature, 1
+    return None
+
+def get_line_parser(fname):
+    '''
+    Picks the row parser for a spreadsheet once, instead of re-checking the
+    filename on every line. Each parser maps a split line to an
+    (inhospital_id, feature, feature_freq) tuple, or None to skip the line.
+    '''
+    for (fname_key, parse_line) in (('life_days', parse_life_days_line),
+        ('herbmed', parse_herbmed_line), ('mr_symp', parse_mr_symp_line),
+        ('syndrome_syndromes', parse_syndromes_line),
+        ('cancer_check_20170324', parse_check_line),
+        ('drug_2017', parse_drug_line),
+        ('cancer_caseinfo', parse_caseinfo_line)):
+        if fname_key in fname:
+            return parse_line
+    print 'file_operations.py: No such file!'
+    exit()
+
+@cached_reader(lambda fname: [fname, './data/cancer_caseinfo.txt'])
+def read_spreadsheet_triplets(fname):
+    '''
+    Parses a spreadsheet in a single pass. Returns a SpreadsheetTriplets with
+    integer patient and feature indices and float values. Only first-time
+    visits are kept.
+    '''
+    first_visit_set = get_first_visit_set()
+    parse_line = get_line_parser(fname)
+    # Ordered vocabularies, with dictionaries for O(1) index lookups.
+    patient_list, patient_index_dct = [], {}
+    feature_list, feature_index_dct = [], {}
+    patient_idx, feature_idx, value = array('i'), array('i'), array('d')
+    f = open(fname, 'r')
+    f.readline() # Skip the header line.
+    for line in f:
+        line = line.strip().split('\t')
+        if len(line) == 1:
+            continue
+        row = parse_line(line)
+        if row == None:
+            continue
+        inhospital_id, feature, feature_freq = row
+        # Don't use second or later visits. TODO.
+        if inhospital_id not in first_visit_set:
+            continue
+        # Deal with folder path / issues.
+        if type(feature) == str:
+            feature = feature.replace('/', '_').replace(' ', '_')
+
+        if inhospital_id not in patient_index_dct:
+            patient_index_dct[inhospital_id] = len(patient_list)
+            patient_list += [inhospital_id]
+        if feature not in feature_index_dct:
+            feature_index_dct[feature] = len(feature_list)
+            feature_list += [feature]
+        patient_idx.append(patient_index_dct[inhospital_id])
+        feature_idx.append(feature_index_dct[feature])
+        value.append(float(feature_freq))
+    f.close()
+    return SpreadsheetTriplets(patient_list, feature_list,
+        np.frombuffer(patient_idx, dtype=np.intc),
+        np.frombuffer(feature_idx, dtype=np.intc),
+        np.frombuffer(value, dtype=np.float64))
+
+def triplets_to_feature_dct(triplets):
+    '''
+    Converts SpreadsheetTriplets back to the OrderedDict mapping each
+    inhospital_id to its list of (feature, feature frequency) tuples.
+    '''
+    feature_dct = OrderedDict((inhospital_id, []) for inhospital_id in
+        triplets.patient_list)
+    patient_list, feature_list = triplets.patient_list, triplets.feature_list
+    for patient_idx, feature_idx, feature_freq in zip(
+        triplets.patient_idx.tolist(), triplets.feature_idx.tolist(),
+        triplets.value.tolist()):
+        feature_dct[patient_list[patient_idx]] += [(feature_list[feature_idx],
+            feature_freq)]
+    return feature_dct
+
 # build_patient_feature_matrix.py
 # drug_herb_synergistic_survival.py
 # run_prosnet.py
@@ -33,109 +204,65 @@ def read_spreadsheet(fname):
     are binary (like the survival labels) and some are frequency vectors.
     Key: inhospital_id -> str
     Value: feature, feature frequency tuple -> (str, float)
+    Thin adapter over read_spreadsheet_triplets, which holds the disk cache.
     '''
-    first_time_id_list = read_case_info()
-    feature_dct, unique_feature_list = OrderedDict({}), []
-    f = open(fname, 'r')
+    triplets = read_spreadsheet_triplets(fname)
+    return triplets_to_feature_dct(triplets), triplets.feature_list[:]
+
+def get_feature_matrix_fnames(suffix):
+    '''
+    Returns the filenames of a feature matrix with the given suffix: the TSV
+    export, the dense .npy and sparse .npz binary payloads, and the sidecar
+    holding the feature names and the survival columns of the binary format.
+    '''
+    base_fname = './data/feature_matrices/feature_matrix%s' % suffix
+    return ('%s.txt' % base_fname, '%s.npy' % base_fname, '%s.npz' %
+        base_fname, '%s_index.txt' % base_fname)
+
+def read_survival_index(index_fname):
+    '''
+    Reads the sidecar of a binary feature matrix. The first line holds the
+    column labels, and each following line a patient's id, death and time.
+    '''
+    master_feature_list, survival_matrix = [], []
+    f = open(index_fname, 'r')
     for i, line in enumerate(f):
-        # Skip all header lines.
-        if i == 0:
-            continue
         line = line.strip().split('\t')
-        if len(line) == 1:
-            continue
-        # Survival events. Output binary labels, along with the event length.
-        if 'life_days' in fname:
-            assert len(line) == 7
-            inhospital_id, feature, feature_freq  = line[0], line[3], line[6]
-            if '死亡' in feature: # 1 is death. 0 is unknown.
-                feature = 1
-            else:
-                feature = 0
-            feature_freq = float(feature_freq) / 30.0 # Convert to months.
-        # Different feature and frequency cases for different spreadsheets.
-        elif 'herbmed' in fname:
-            assert len(line) == 4
-            inhospital_id, feature_freq, feature = line[:3]
-        elif 'mr_symp' in fname:
-            assert len(line) == 3
-            inhospital_id, feature, feature_freq = line
-        elif 'syndrome_syndromes' in fname:
-            assert len(line) == 3
-            inhospital_id, feature, feature_freq = line[1], line[2], 1
-        # elif 'incase_check' in fname:
-        #     assert len(line) == 9
-        #     inhospital_id, feature, feature_freq = line[0], line[3], line[4]
-        #     # Skip negative tests.
-        #     # TODO: good results with without cost condition.
-        #     if feature_freq in ['无', '否', '没有'] or '费' in feature or (feature
-        #         in ['住院天数', '阴影部位', '影像学诊断类型']):
-        #         inhospital_id = 'bad_id'
-        #         continue
-        #     elif '级' in feature_freq:
-        #         feature_freq = feature_freq[:feature_freq.index('级')]
-        #     try:
-        #         feature_freq = float(feature_freq)
-        #         # Skip 0 features.
-        #         if feature_freq == 0.0:
-        #             inhospital_id = 'bad_id'
-        #             continue
-        #     except:
-        #         feature_freq = 1
-        elif 'cancer_check_20170324' in fname:
-            if len(line) != 9:
-                continue
-            inhospital_id, feature, feature_freq = line[0], line[6], line[8]
-            if feature_freq == '有':
-                feature_freq = 1
-            elif feature_freq == '无':
-                continue
-            elif '级' in feature_freq:
-                feature_freq = feature_freq[:feature_freq.index('级')]
-            try:
-                feature_freq = float(feature_freq)
-            except:
-                # TODO: What to do with unfloatable things.
-                # feature_freq = 1
-                continue
-        elif 'drug_2017' in fname:
-            assert len(line) == 10
-            inhospital_id, feature, feature_freq = line[0], line[1], line[4]
-        # TODO: Currently adding in senior citizen status.
-        elif 'cancer_caseinfo' in fname:
-            assert len(line) == 7
-            inhospital_id, feature, feature_freq = line[0], 'senior', line[6]
-            if int(feature_freq) >= 65:
-                feature_freq = 1
-            else:
-                continue
-        else:
-            print 'file_operations.py line 97: No such file!'
-            exit()
-        # Don't use second or later visits. TODO.
-        if inhospital_id not in first_time_id_list:
+        if i == 0:
+            master_feature_list = line[3:]
             continue
-        if inhospital_id not in feature_dct:
-            feature_dct[inhospital_id] = []
-        # Deal with folder path / issues.
-        if type(feature) == str:
-            feature = feature.replace('/', '_')
-            feature = feature.replace(' ', '_')
-        feature_dct[inhospital_id] += [(feature, float(feature_freq))]
-        if feature not in unique_feature_list:
-            unique_feature_list += [feature]
+        survival_matrix += [(line[0], int(line[1]), float(line[2]))]
     f.close()
-    return feature_dct, unique_feature_list
+    return master_feature_list, survival_matrix
 
 # cluster_cancer_subtypes.py
-def read_feature_matrix(suffix):
+def read_feature_matrix(suffix, mmap_mode='r', dense=True):
     '''
     Reads the feature matrix of the patient data. Takes an optional argument in
-    the form of '_50'.
+    the form of '_50'. Reads the binary format when it is at least as new as
+    the TSV. Dense binary matrices are memory-mapped with mmap_mode, and
+    sparse ones are only densified if dense is True.
     '''
+    tsv_fname, npy_fname, npz_fname, index_fname = get_feature_matrix_fnames(
+        suffix)
+    # Pick the most recently written format.
+    fname_lst = [fname for fname in (npy_fname, npz_fname, tsv_fname) if
+        os.path.exists(fname)]
+    fname = max(fname_lst, key=os.path.getmtime) if fname_lst else tsv_fname
+
+    if fname == npy_fname:
+        master_feature_list, survival_matrix = read_survival_index(index_fname)
+        return np.load(npy_fname, mmap_mode=mmap_mode), master_feature_list, (
+            survival_matrix)
+    elif fname == npz_fname:
+        master_feature_list, survival_matrix = read_survival_index(index_fname)
+        feature_matrix = load_npz(npz_fname)
+        if dense:
+            feature_matrix = feature_matrix.toarray()
+        return feature_matrix, master_feature_list, survival_matrix
+
     feature_matrix, master_feature_list, survival_matrix = [], [], []
-    fname = './data/feature_matrices/feature_matrix%s.txt' % suffix
-    f = open(fname, 'r')
+    f = open(tsv_fname, 'r')
     for i, line in enumerate(f):
         line = line.strip().split('\t')
         feature_list = line[3:]
@@ -181,6 +308,7 @@ def get_dictionary_symptom_herb_set():
     return symptom_herb_set
 
 # run_prosnet.py
+@cached_reader(lambda: ['./data/hgnc_to_entrez.txt'])
 def get_entrez_to_hgnc_dct():
     '''
     Gets mappings from HGNC ID's to Entrez ID's.
@@ -199,12 +327,96 @@ def get_entrez_to_hgnc_dct():
     f.close()    
     return entrez_to_hgnc_dct
 
+# Matches every non-Chinese character of a unicode string.
+non_chinese_pattern = re.compile(u'[^\u4e00-\u9fff]')
+
+def normalize_herb_name(herb):
+    '''
+    Removes non-Chinese characters from a UTF-8 herb name.
+    '''
+    return non_chinese_pattern.sub(u'', herb.decode('utf-8')).encode('utf-8')
+
+# run_prosnet.py
+@cached_reader(lambda: ['./data/herb_protein_relations.txt'])
+def get_protein_herb_edge_set():
+    '''
+    Get the set of (protein, herb) edges.
+    '''
+    protein_herb_edge_set = set([])
+    f = open('./data/herb_protein_relations.txt', 'r')
+    for line in f:
+        line = line.strip().split('\t')
+        if len(line) < 3:
+            continue
+        # Format: Scientific name, Chinese name, list of proteins.
+        herb = normalize_herb_name(line[1])
+        # Add the protein-herb edge.
+        for protein in line[2:]:
+            protein_herb_edge_set.add((protein, herb))
+    f.close()
+    return protein_herb_edge_set
+
+# run_prosnet.py
+@cached_reader(lambda: ['./data/HumanNet.v1.benchmark.txt',
+    './data/hgnc_to_entrez.txt'])
+def read_ppi_edge_array():
+    '''
+    Reads the PPI network into an integer array with np.loadtxt, and maps its
+    Entrez ID's to protein indices through a dense lookup array. Returns the
+    list of HGNC proteins, and the unique (source, target) edges as index
+    arrays into it. Edges with an endpoint without an HGNC analogue are
+    dropped.
+    '''
+    entrez_to_hgnc_dct = get_entrez_to_hgnc_dct()
+    entrez_id_lst = sorted(int(entrez_id) for entrez_id in entrez_to_hgnc_dct
+        if entrez_id.isdigit())
+    hgnc_lst = [entrez_to_hgnc_dct[str(entrez_id)] for entrez_id in
+        entrez_id_lst]
+
+    # Gene ID's in this PPI network are Entrez ID's.
+    ppi_fname = './data/HumanNet.v1.benchmark.txt'
+    try:
+        entrez_edges = np.loadtxt(ppi_fname, dtype=np.int64, ndmin=2)
+    except ValueError as e:
+        raise ValueError('%s must have two integer columns: %s' % (ppi_fname,
+            e))
+    assert entrez_edges.size == 0 or entrez_edges.shape[1] == 2, ppi_fname
+    entrez_edges = entrez_edges.reshape(-1, 2)
+
+    # Protein index of each Entrez ID, -1 for ID's without an HGNC analogue.
+    # The lookup takes 4 bytes per ID up to the largest mapped one.
+    protein_lookup = np.full(entrez_id_lst[-1] + 1 if entrez_id_lst else 0,
+        -1, dtype=np.int32)
+    protein_lookup[entrez_id_lst] = np.arange(len(entrez_id_lst))
+    is_in_range = ((entrez_edges >= 0) & (entrez_edges < len(protein_lookup))
+        ).all(axis=1)
+    protein_edges = protein_lookup[entrez_edges[is_in_range]]
+    protein_edges = protein_edges[(protein_edges >= 0).all(axis=1)].astype(
+        np.int64)
+
+    # Remove duplicate edges.
+    edge_codes = np.unique(protein_edges[:,0] * len(hgnc_lst) + protein_edges[
+        :,1])
+    return hgnc_lst, (edge_codes // len(hgnc_lst)).astype(np.int32), (
+        edge_codes % len(hgnc_lst)).astype(np.int32)
+
+# run_prosnet.py
+def get_ppi_edge_set():
+    '''
+    Get the protein-protein edge set from a PPI network.
+    '''
+    hgnc_lst, src_idx_arr, dst_idx_arr = read_ppi_edge_array()
+    return set((hgnc_lst[src_idx], hgnc_lst[dst_idx]) for src_idx, dst_idx in
+        zip(src_idx_arr.tolist(), dst_idx_arr.tolist()))
+
 # run_prosnet.py
+@cached_reader(lambda: ['./data/smoking_history.txt',
+    './data/cancer_caseinfo.txt'])
 def read_smoking_history():
     '''
     Read the patient history, including the smoking history.
     '''
-    first_time_id_list = read_case_info()
+    first_visit_set = get_first_visit_set()
     feature_dct = OrderedDict({})
     binary_feature_list = (['V肝炎病史', 'V高血压病史', 'V冠心病史', 'V家族遗传性疾病',
                 # 'V输血史', 'V吸烟史', 'V药物过敏史', 'V有无慢性肺部疾病史', 'V中毒史',
@@ -223,7 +435,7 @@ def read_smoking_history():
                 feature_index_dct[feature] = header_line.index(feature)
             continue
         inhospital_id = line[0]
-        if inhospital_id not in first_time_id_list:
+        if inhospital_id not in first_visit_set:
             continue
 
         # Don't use second or later visits.
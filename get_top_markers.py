@@ -2,16 +2,27 @@
 # -*- coding: utf-8 -*-
 # Author: Edward Huang
 
+import argparse
+from collections import namedtuple
+from cox import fit_cox_columns
 from file_operations import read_spreadsheet, read_feature_matrix
 import numpy as np
-import operator
 import os
-import subprocess
+from survival import get_group_risk_tables, get_median_survival_columns
+from survival import get_survival_arrays, logrank_test_columns
 
 ### This script goes through each of the markers, separating patients of each
 ### cancer subtype into one cluster that contains the marker, and another
 ### cluster that does not contain the marker. Writes out to file the markers
 ### that best separate patients into clusters with different survival functions.
+### All markers of a subtype are tested together, from one sort of the
+### survival times.
+
+# Log-rank test of one marker's split. The hazard ratio is the Cox exp(coef) of
+# the marker cluster against the rest.
+MarkerResult = namedtuple('MarkerResult', ['marker', 'p_value',
+    'non_marker_patients', 'marker_patients', 'non_marker_median',
+    'marker_median', 'hazard_ratio'])
 
 def generate_directories():
     folder_lst = ['./results/top_markers', './results/top_marker_plots']
@@ -47,13 +58,11 @@ def get_subtype_labels(survival_mat):
             labels += [0]
     return labels
 
-def write_marker_dataframes():
+def get_marker_lst(mast_feature_list):
     '''
-    Writes out the dataframes for each of the cancer subtypes.
+    Returns the (column index, marker, is medical test) of every symptom,
+    syndrome and medical test marker in the feature matrix.
     '''
-    feature_matrix, mast_feature_list, survival_mat = read_feature_matrix('_raw')
-    subtype_labels = get_subtype_labels(survival_mat)
-
     marker_feature_set, test_feature_set = set([]), set([])
     for fname in ('cancer_other_info_mr_symp', 'cancer_syndrome_syndromes',
         'cancer_check_20170324'):
@@ -61,100 +70,117 @@ def write_marker_dataframes():
             marker_feature_set.add(feat)
             if 'check' in fname: # Create set of medical test features.
                 test_feature_set.add(feat)
+    return [(feat_idx, feat, feat in test_feature_set) for feat_idx, feat in
+        enumerate(mast_feature_list) if feat in marker_feature_set]
 
-    marker_patient_dct = [0, {}, {}]
-    for cancer_idx in [1, 2]:
-    # for cancer_idx in [2]:
-        cancer_idx_lst = [i for i, e in enumerate(subtype_labels) if e == cancer_idx]
-        # Slice the feature and survival matrices.
-        cancer_mat = feature_matrix[cancer_idx_lst]
-        surv_mat = [survival_mat[j] for j in cancer_idx_lst]
+def screen_markers(cancer_mat, surv_mat, marker_lst):
+    '''
+    Splits the patients of one subtype on every marker at once, into those
+    with the marker and those without. Markers that no patient has, or that
+    put every patient on one side, are skipped. Returns a MarkerResult per
+    marker, sorted by log-rank p-value. Undefined p-values, e.g. when no
+    patient died, go last.
+    '''
+    feat_idx_lst, marker_name_lst, is_test_lst = zip(*marker_lst)
+    marker_matrix = np.asarray(cancer_mat)[:, feat_idx_lst]
+    # Skip features that no patients have (columns of all zeros).
+    has_marker = np.any(marker_matrix, axis=0)
+    marker_matrix = marker_matrix[:, has_marker]
+    marker_name_lst = [marker for i, marker in enumerate(marker_name_lst) if
+        has_marker[i]]
+    # Threshold for which to separate patients into two clusters. Default is
+    # the binary threshold, and medical tests use their median.
+    threshold_arr = np.where(np.array(is_test_lst)[has_marker], np.median(
+        marker_matrix, axis=0), 0.5)
+    group_matrix = (marker_matrix > threshold_arr).T
+    # Skip splits with every patient on one side, which cannot be tested.
+    group_size_arr = group_matrix.sum(axis=1)
+    is_split = (group_size_arr > 0) & (group_size_arr < group_matrix.shape[1])
+    group_matrix = group_matrix[is_split]
+    marker_name_lst = [marker for i, marker in enumerate(marker_name_lst) if
+        is_split[i]]
+    if len(marker_name_lst) == 0:
+        return []
 
-        for marker in marker_feature_set:
-        # for marker in ['阻塞性肺炎']:
-            if marker not in mast_feature_list:
-                continue
-            feat_idx = mast_feature_list.index(marker)
-            # Slice the matrix.
-            sliced_matrix = cancer_mat[:,feat_idx]
-            # Skip features that no patients have (array of all zeros).
-            if not np.any(sliced_matrix):
-                continue
-            # Get the threshold for which to separate patients into two clusters.
-            threshold = 0.5 # Default: binary threshold.
-            if marker in test_feature_set:
-                threshold = np.median(sliced_matrix)
-            marker_patient_tup = cluster_and_write(sliced_matrix, surv_mat, cancer_idx, marker, threshold)
-            marker_patient_dct[cancer_idx][marker] = marker_patient_tup
-    return marker_patient_dct
-
-def cluster_and_write(feature_matrix, survival_mat, cancer_idx, marker, threshold):
-    # First element is list of patients with the feature.
-    marker_patient_tup = [[], []]
-    # Parentheses giving R some trouble.
-    marker = marker.replace('(', '')
-    marker = marker.replace(')', '')
-    # Write out the dataframe.
-    fname = './results/top_markers/%s_%s.txt' % (marker, cancer_idx)
-    out = open(fname, 'w')
-    out.write('death\ttime\tcluster\n')
-    for patient_idx, patient_tup in enumerate(survival_mat):
-        inhospital_id, death, time = patient_tup
-        # Separate the patients into two groups based on whether they have the marker.
-        tag = feature_matrix[patient_idx]
-        if tag <= threshold:
-            tag = 0
-        else:
-            tag = 1
-        marker_patient_tup[tag] += [inhospital_id]
-        out.write('%d\t%g\t%d\n' % (death, time, tag))
+    time_arr, event_arr = get_survival_arrays(surv_mat)
+    (event_time_arr, num_deaths, num_risk, marker_death_matrix,
+        marker_risk_matrix) = get_group_risk_tables(time_arr, event_arr,
+        group_matrix)
+    chisq_arr, p_value_arr = logrank_test_columns(num_deaths, num_risk,
+        marker_death_matrix, marker_risk_matrix)
+    # One single-covariate Cox model per marker, fit together.
+    hazard_ratio_arr = np.exp(fit_cox_columns(group_matrix.T, time_arr,
+        event_arr).coef)
+    marker_median_arr = get_median_survival_columns(event_time_arr,
+        marker_death_matrix, marker_risk_matrix)
+    non_marker_median_arr = get_median_survival_columns(event_time_arr,
+        num_deaths - marker_death_matrix, num_risk - marker_risk_matrix)
+
+    patient_arr = np.array([inhospital_id for (inhospital_id, death, time) in
+        surv_mat])
+    result_lst = []
+    for i, marker in enumerate(marker_name_lst):
+        result_lst += [MarkerResult(marker, p_value_arr[i], list(patient_arr[
+            ~group_matrix[i]]), list(patient_arr[group_matrix[i]]),
+            non_marker_median_arr[i], marker_median_arr[i],
+            hazard_ratio_arr[i])]
+    # NaN keys would break the sort order.
+    return sorted(result_lst, key=lambda result: (np.isnan(result.p_value),
+        result.p_value))
+
+def write_top_markers(result_lst, fname):
+    out = open('./results/top_markers/%s.txt' % fname, 'w')
+    out.write('Marker\tSurvival difference p-value\tNon-marker cluster size\tNon-marker patients\tMarker cluster size\tMarker patients\tNon-marker median survival\tMarker median survival\tCox exp(coef)\n')
+    for result in result_lst:
+        a_size = len(result.non_marker_patients)
+        b_size = len(result.marker_patients)
+        # Skip lopsided clusterings.
+        if a_size < 0.05 * b_size or b_size < 0.05 * a_size:
+            continue
+        out.write('%s\t%g\t%d\t%s\t%d\t%s\t%g\t%g\t%g\n' % (result.marker,
+            result.p_value, a_size, ';'.join(result.non_marker_patients),
+            b_size, ';'.join(result.marker_patients), result.non_marker_median,
+            result.marker_median, result.hazard_ratio))
     out.close()
-    # Call the R script to compute survival function differences.
-    command = 'Rscript compute_marker_p.R %s_%s' % (marker, cancer_idx)
-    subprocess.call(command, shell=True)
-    return marker_patient_tup
+
+def plot_top_markers(result_lst, cancer_idx, surv_mat, num_plots):
+    '''
+    Plots the Kaplan-Meier curves of the split of the best markers.
+    '''
+    # Only plotting needs matplotlib.
+    from plot_kaplan_meiers import plot_kaplan_meiers
+    time_arr, event_arr = get_survival_arrays(surv_mat)
+    patient_arr = np.array([inhospital_id for (inhospital_id, death, time) in
+        surv_mat])
+    for result in result_lst[:num_plots]:
+        tag_arr = np.in1d(patient_arr, result.marker_patients).astype(int)
+        plot_kaplan_meiers(time_arr, event_arr, tag_arr,
+            './results/top_marker_plots/%s_%s.png' % (result.marker,
+            cancer_idx))
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num_plots', type=int, default=0, help='Optional. Plot the Kaplan-Meier curves of the n best markers of each subtype.')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     generate_directories()
-    marker_patient_dct = write_marker_dataframes()
 
-    sq_dct, non_sq_dct = {}, {}
-    folder = './results/top_markers'
-    folder_list = os.listdir(folder)[:]
-    for fname in folder_list:
-        if 'squamous' in fname or '_p.txt' not in fname:
-            continue
-        f = open('%s/%s' % (folder, fname), 'r')
-        try:
-            p_val = float(f.readline())
-            clus_size = map(int, f.readline().split())
-            f.readline() # Skip an empty line because of coxph issues.
-            cox_ratio = float(f.readline())
-        except Exception:
-            continue
-        # fname[:-6] is the name of the marker.
-        key = (fname[:-8], clus_size[0], clus_size[1], cox_ratio)
-        if '_1_' in fname:
-            sq_dct[key] = p_val
-        else:
-            non_sq_dct[key] = p_val
-        f.close()
-    # Sort the dictionaries.
-    sq_dct = sorted(sq_dct.items(), key=operator.itemgetter(1))
-    non_sq_dct = sorted(non_sq_dct.items(), key=operator.itemgetter(1))
-
-    for (dct, patient_dct, fname) in [(sq_dct, marker_patient_dct[1],
-        'squamous_markers'), (non_sq_dct, marker_patient_dct[2], 'non_squamous_markers')]:
-        out = open('./results/top_markers/%s.txt' % fname, 'w')
-        out.write('Marker\tSurvival difference p-value\tNon-marker cluster size\tNon-marker patients\tMarker cluster size\tMarker patients\tCox exp(coef)\n')
-        for (marker, a_size, b_size, cox_ratio), p_val in dct:
-            # Skip lopsided clusterings.
-            if a_size < 0.05 * b_size or b_size < 0.05 * a_size:
-                continue
-            out.write('%s\t%g\t%d\t%s\t%d\t%s\t%g\n' % (marker, p_val, a_size,
-                ';'.join(patient_dct[marker][0]), b_size,
-                ';'.join(patient_dct[marker][1]), cox_ratio))
-        out.close()
+    feature_matrix, mast_feature_list, survival_mat = read_feature_matrix('_raw')
+    subtype_labels = get_subtype_labels(survival_mat)
+    marker_lst = get_marker_lst(mast_feature_list)
+
+    for cancer_idx, fname in [(1, 'squamous_markers'), (2,
+        'non_squamous_markers')]:
+        cancer_idx_lst = [i for i, e in enumerate(subtype_labels) if e == cancer_idx]
+        # Slice the feature and survival matrices.
+        cancer_mat = feature_matrix[cancer_idx_lst]
+        surv_mat = [survival_mat[j] for j in cancer_idx_lst]
+        result_lst = screen_markers(cancer_mat, surv_mat, marker_lst)
+        write_top_markers(result_lst, fname)
+        if args.num_plots > 0:
+            plot_top_markers(result_lst, cancer_idx, surv_mat, args.num_plots)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,173 @@
+### Author: Edward Huang
+
+from collections import namedtuple
+import itertools
+import multiprocessing
+import numpy as np
+from sklearn.cluster import KMeans
+
+### K-means with many random restarts, spread across a process pool. Restart
+### i always uses the i-th seed drawn from random_state, the same seeds that
+### KMeans(n_init, random_state, n_jobs > 1) uses, so the best clustering is
+### reproducible regardless of the number of processes. Restarts can stop
+### early, once the best inertia has not improved for a number of restarts.
+### Memory-mapped inputs are clustered by a k-means that reads them in blocks
+### of rows, so they never have to fit in memory.
+
+KMeansResult = namedtuple('KMeansResult', ['labels', 'inertia',
+    'num_restarts'])
+
+# Relative improvement in inertia that counts as a new best clustering.
+improve_tol = 1e-9
+
+def init_worker(data_matrix, n_clusters, block_rows, abs_tol):
+    global worker_data_matrix, worker_n_clusters, worker_block_rows
+    global worker_abs_tol
+    worker_data_matrix, worker_n_clusters = data_matrix, n_clusters
+    worker_block_rows, worker_abs_tol = block_rows, abs_tol
+
+def run_restart(seed):
+    '''
+    Runs a single k-means restart, and returns its inertia and labels.
+    '''
+    if isinstance(worker_data_matrix, np.memmap):
+        return blocked_kmeans(worker_data_matrix, worker_n_clusters, seed,
+            worker_block_rows, worker_abs_tol)
+    est = KMeans(n_clusters=worker_n_clusters, n_init=1, random_state=seed)
+    est.fit(worker_data_matrix)
+    return est.inertia_, est.labels_
+
+def iter_blocks(data_matrix, block_rows):
+    for start in range(0, data_matrix.shape[0], block_rows):
+        yield np.asarray(data_matrix[start:start + block_rows],
+            dtype=np.float64)
+
+def get_abs_tol(data_matrix, block_rows, tol=1e-4):
+    '''
+    Converts the relative tolerance of KMeans into a bound on the squared
+    center shift: tol times the mean variance of the columns.
+    '''
+    col_sum, col_sq_sum = 0, 0
+    for block in iter_blocks(data_matrix, block_rows):
+        col_sum = col_sum + block.sum(axis=0)
+        col_sq_sum = col_sq_sum + np.sum(block ** 2, axis=0)
+    num_rows = float(data_matrix.shape[0])
+    return tol * np.mean(col_sq_sum / num_rows - (col_sum / num_rows) ** 2)
+
+def get_sq_distances(data_matrix, center_matrix, block_rows):
+    '''
+    Returns the squared Euclidean distances from every row of data_matrix to
+    every center, reading data_matrix one block of rows at a time.
+    '''
+    center_sq_norms = np.sum(center_matrix ** 2, axis=1)
+    sq_dist_lst = []
+    for block in iter_blocks(data_matrix, block_rows):
+        sq_dist = np.sum(block ** 2, axis=1)[:, np.newaxis] - 2 * block.dot(
+            center_matrix.T) + center_sq_norms
+        sq_dist_lst += [np.maximum(sq_dist, 0)]
+    return np.vstack(sq_dist_lst)
+
+def init_centers(data_matrix, n_clusters, rand, block_rows):
+    '''
+    Greedy k-means++ seeding, as in KMeans: each new center is the best of a
+    few candidates drawn proportional to the squared distance.
+    '''
+    num_rows = data_matrix.shape[0]
+    center_idx_lst = [rand.randint(num_rows)]
+    closest_sq_dist = get_sq_distances(data_matrix, np.asarray(data_matrix[
+        center_idx_lst], dtype=np.float64), block_rows)[:, 0]
+    num_trials = 2 + int(np.log(n_clusters))
+    for i in range(1, n_clusters):
+        candidate_idx = np.minimum(np.searchsorted(np.cumsum(closest_sq_dist),
+            rand.random_sample(num_trials) * closest_sq_dist.sum()),
+            num_rows - 1)
+        candidate_sq_dist = np.minimum(closest_sq_dist[:, np.newaxis],
+            get_sq_distances(data_matrix, np.asarray(data_matrix[
+            candidate_idx], dtype=np.float64), block_rows))
+        best_trial = np.argmin(candidate_sq_dist.sum(axis=0))
+        center_idx_lst += [candidate_idx[best_trial]]
+        closest_sq_dist = candidate_sq_dist[:, best_trial]
+    return np.asarray(data_matrix[center_idx_lst], dtype=np.float64)
+
+def blocked_kmeans(data_matrix, n_clusters, seed, block_rows, abs_tol,
+    max_iter=300):
+    '''
+    Lloyd's k-means on data_matrix, one block of rows at a time. Only the
+    centers and the per-row labels are held in memory. Returns the inertia
+    and the labels.
+    '''
+    rand = np.random.RandomState(seed)
+    center_matrix = init_centers(data_matrix, n_clusters, rand, block_rows)
+    for i in range(max_iter):
+        sum_matrix = np.zeros(center_matrix.shape)
+        count_arr = np.zeros(n_clusters)
+        for block in iter_blocks(data_matrix, block_rows):
+            labels = np.argmin(get_sq_distances(block, center_matrix,
+                block_rows), axis=1)
+            sum_matrix += (labels[:, np.newaxis] == np.arange(n_clusters)
+                ).T.dot(block)
+            count_arr += np.bincount(labels, minlength=n_clusters)
+        # Empty clusters keep their previous center.
+        new_center_matrix = center_matrix.copy()
+        is_filled = count_arr > 0
+        new_center_matrix[is_filled] = sum_matrix[is_filled] / count_arr[
+            is_filled][:, np.newaxis]
+        center_shift = np.sum((new_center_matrix - center_matrix) ** 2)
+        center_matrix = new_center_matrix
+        if center_shift <= abs_tol:
+            break
+    sq_dist = get_sq_distances(data_matrix, center_matrix, block_rows)
+    labels = np.argmin(sq_dist, axis=1)
+    return sq_dist[np.arange(len(labels)), labels].sum(), labels
+
+def get_restart_seeds(n_init, random_state=930519):
+    return np.random.RandomState(random_state).randint(np.iinfo(np.int32).max,
+        size=n_init)
+
+def fit_kmeans(data_matrix, n_clusters=2, n_init=1000, random_state=930519,
+    patience=None, num_processes=None, max_block_bytes=2 ** 26):
+    '''
+    Clusters the rows of data_matrix with the best of n_init k-means restarts.
+    Results are consumed in seed order, so the best clustering and the early
+    stop are the same for any num_processes (defaults to every CPU). If
+    patience is given, stops once that many restarts in a row haven't improved
+    the best inertia. An np.memmap data_matrix is read in blocks of at most
+    max_block_bytes per process. Returns a KMeansResult.
+    '''
+    seeds = get_restart_seeds(n_init, random_state)
+    if num_processes == None:
+        num_processes = multiprocessing.cpu_count()
+    block_rows = max(1, max_block_bytes // (8 * max(data_matrix.shape[1], 1)))
+    abs_tol = None
+    if isinstance(data_matrix, np.memmap):
+        abs_tol = get_abs_tol(data_matrix, block_rows)
+    # A single process runs the restarts itself, e.g. inside a pool worker.
+    if num_processes == 1:
+        init_worker(data_matrix, n_clusters, block_rows, abs_tol)
+        pool, restart_iter = None, itertools.imap(run_restart, seeds)
+    else:
+        pool = multiprocessing.Pool(num_processes, init_worker, (data_matrix,
+            n_clusters, block_rows, abs_tol))
+        # Small chunks, so an early stop wastes little work.
+        chunk_size = max(1, min(10, n_init // (4 * num_processes)))
+        restart_iter = pool.imap(run_restart, seeds, chunk_size)
+
+    best_inertia, best_labels, num_stable, num_restarts = np.inf, None, 0, 0
+    for inertia, labels in restart_iter:
+        num_restarts += 1
+        # Ties keep the earlier restart, like KMeans.
+        if inertia < best_inertia * (1 - improve_tol):
+            num_stable = 0
+        else:
+            num_stable += 1
+        if inertia < best_inertia:
+            best_inertia, best_labels = inertia, labels
+        if patience != None and num_stable >= patience:
+            break
+    if pool != None:
+        pool.terminate()
+        pool.join()
+
+    print 'k-means restarts: %d of %d, best inertia %g' % (num_restarts,
+        n_init, best_inertia)
+    return KMeansResult(list(best_labels), best_inertia, num_restarts)
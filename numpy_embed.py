@@ -0,0 +1,163 @@
+### Author: Edward Huang
+
+import multiprocessing
+import numpy as np
+from prosnet_network import read_network
+from scipy.sparse import csr_matrix
+
+### In-process alternative to the ProSNet embed binary. Trains node vectors on
+### the written ProSNet network with restart-based random walks and a batched
+### negative sampling objective. Worker processes train on the same vector
+### matrices in shared memory, lock-free, and the vectors are written in the
+### text format of embed.
+
+# Number of walks per training batch.
+batch_size = 1024
+# Initial learning rate, decayed linearly over the training samples.
+init_lr = 0.025
+
+def get_shared_matrix(shared_array, num_dim):
+    return np.frombuffer(shared_array).reshape(-1, num_dim)
+
+def sample_neighbors(adj_matrix, cum_weight_arr, node_arr, rand):
+    '''
+    Samples one neighbor of every node in node_arr, proportional to the edge
+    weights. cum_weight_arr is the cumulative sum of adj_matrix.data.
+    '''
+    row_start, row_end = adj_matrix.indptr[node_arr], adj_matrix.indptr[
+        node_arr + 1]
+    # Cumulative weight before each row, and each row's total weight.
+    base_arr = cum_weight_arr[row_start] - adj_matrix.data[row_start]
+    row_weight_arr = cum_weight_arr[row_end - 1] - base_arr
+    edge_idx = np.searchsorted(cum_weight_arr, base_arr + rand.random_sample(
+        len(node_arr)) * row_weight_arr, side='right')
+    # Guard against rounding at the end of a row.
+    edge_idx = np.minimum(edge_idx, row_end - 1)
+    return adj_matrix.indices[edge_idx]
+
+def sample_walk_pairs(adj_matrix, cum_weight_arr, source_arr, depth, restart,
+    rand):
+    '''
+    Walks depth steps from every source node. After each step, the walk
+    returns to its source with probability restart. Every visited node is
+    paired with the source of its walk. Returns the (source, context) arrays.
+    '''
+    current_arr = source_arr
+    context_lst = []
+    for step in range(depth):
+        current_arr = sample_neighbors(adj_matrix, cum_weight_arr,
+            current_arr, rand)
+        context_lst += [current_arr]
+        is_restart = rand.random_sample(len(current_arr)) < restart
+        current_arr = np.where(is_restart, source_arr, current_arr)
+    return np.tile(source_arr, depth), np.concatenate(context_lst)
+
+def scatter_add(matrix, idx_arr, update_matrix):
+    '''
+    Adds every row of update_matrix to row idx_arr[i] of matrix, summing the
+    updates of repeated indices. Equivalent to np.add.at, but much faster.
+    '''
+    unique_idx_arr, inverse_arr = np.unique(idx_arr, return_inverse=True)
+    sum_matrix = csr_matrix((np.ones(len(idx_arr)), (inverse_arr, np.arange(
+        len(idx_arr)))), shape=(len(unique_idx_arr), len(idx_arr)))
+    matrix[unique_idx_arr] += sum_matrix.dot(update_matrix)
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+def train_batch(vertex_matrix, context_matrix, source_arr, context_arr,
+    negative_matrix, lr):
+    '''
+    One gradient step of the negative sampling objective on a batch. Every
+    (source, context) pair is pushed together and the source is pushed away
+    from its row of negative samples.
+    '''
+    source_vecs = vertex_matrix[source_arr]
+    # Gradient scales of the positive and negative pairs.
+    pos_grad = (1 - sigmoid(np.sum(source_vecs * context_matrix[context_arr],
+        axis=1))) * lr
+    negative_vecs = context_matrix[negative_matrix]
+    neg_grad = -sigmoid(np.einsum('ij,ikj->ik', source_vecs,
+        negative_vecs)) * lr
+
+    source_update = pos_grad[:, np.newaxis] * context_matrix[context_arr] + (
+        np.einsum('ik,ikj->ij', neg_grad, negative_vecs))
+    scatter_add(context_matrix, np.concatenate([context_arr,
+        negative_matrix.ravel()]), np.vstack([pos_grad[:, np.newaxis] *
+        source_vecs, (neg_grad[:, :, np.newaxis] * source_vecs[:,
+        np.newaxis, :]).reshape(-1, source_vecs.shape[1])]))
+    scatter_add(vertex_matrix, source_arr, source_update)
+
+def train_worker(worker_id, vertex_array, context_array, adj_matrix,
+    num_dim, num_walks, num_iters, negative, depth, restart, seed):
+    '''
+    Trains on num_walks walks per iteration. The learning rate is decayed over
+    this worker's share of the walks.
+    '''
+    rand = np.random.RandomState(seed + worker_id)
+    vertex_matrix = get_shared_matrix(vertex_array, num_dim)
+    context_matrix = get_shared_matrix(context_array, num_dim)
+    cum_weight_arr = np.cumsum(adj_matrix.data)
+    # Walks start at nodes by weighted degree, negatives by degree^0.75.
+    degree_arr = np.asarray(adj_matrix.sum(axis=1)).ravel()
+    source_cum_arr = np.cumsum(degree_arr / degree_arr.sum())
+    negative_cum_arr = np.cumsum(degree_arr ** 0.75)
+    negative_cum_arr /= negative_cum_arr[-1]
+
+    total_walks, walk_count = num_walks * num_iters, 0
+    for iteration in range(num_iters):
+        for batch_start in range(0, num_walks, batch_size):
+            num_batch_walks = min(batch_size, num_walks - batch_start)
+            lr = max(init_lr * (1 - float(walk_count) / total_walks),
+                init_lr * 1e-4)
+            source_arr = np.minimum(np.searchsorted(source_cum_arr,
+                rand.random_sample(num_batch_walks)), len(degree_arr) - 1)
+            source_arr, context_arr = sample_walk_pairs(adj_matrix,
+                cum_weight_arr, source_arr, depth, restart, rand)
+            negative_matrix = np.minimum(np.searchsorted(negative_cum_arr,
+                rand.random_sample((len(source_arr), negative))), len(
+                degree_arr) - 1)
+            train_batch(vertex_matrix, context_matrix, source_arr,
+                context_arr, negative_matrix, lr)
+            walk_count += num_batch_walks
+
+def write_vectors(vector_matrix, node_lst, out_fname):
+    '''
+    Writes the vectors in the text format of embed: a header with the number
+    of nodes and dimensions, then one node and its vector per line.
+    '''
+    out = open(out_fname, 'w')
+    out.write('%d %d\n' % vector_matrix.shape)
+    for node, vector in zip(node_lst, vector_matrix):
+        out.write('%s %s\n' % (node, ' '.join('%f' % val for val in vector)))
+    out.close()
+
+def embed_network(node_fname, edge_fname, output_prefix, num_dim,
+    num_threads=12, negative=5, samples=1, iters=501, depth=10, restart=0.8,
+    seed=930519):
+    '''
+    Trains num_dim-dimensional vectors on the network and writes them to
+    output_prefix_<iters - 1>, like embed. Every iteration runs samples walks
+    per node, split across num_threads worker processes.
+    '''
+    node_lst, adj_matrix = read_network(node_fname, edge_fname)
+    num_nodes = len(node_lst)
+    # Vertex vectors start small and random, context vectors at zero.
+    vertex_array = multiprocessing.RawArray('d', num_nodes * num_dim)
+    context_array = multiprocessing.RawArray('d', num_nodes * num_dim)
+    get_shared_matrix(vertex_array, num_dim)[:] = (np.random.RandomState(
+        seed).random_sample((num_nodes, num_dim)) - 0.5) / num_dim
+
+    num_walks = max(1, samples * num_nodes // num_threads)
+    worker_lst = [multiprocessing.Process(target=train_worker, args=(
+        worker_id, vertex_array, context_array, adj_matrix, num_dim,
+        num_walks, iters, negative, depth, restart, seed)) for worker_id in
+        range(num_threads)]
+    for worker in worker_lst:
+        worker.start()
+    for worker in worker_lst:
+        worker.join()
+        assert worker.exitcode == 0
+
+    write_vectors(get_shared_matrix(vertex_array, num_dim), node_lst,
+        '%s_%d' % (output_prefix, iters - 1))
@@ -0,0 +1,49 @@
+### Author: Edward Huang
+
+import numpy as np
+import os
+from scipy.spatial.distance import cdist
+import tempfile
+
+### Blocked cosine distance matrix between patients, for the BCB clustering
+### path. Matrices that fit the memory budget are built in memory, in double
+### precision. Larger ones are written in single precision, one block of rows
+### at a time, to a memory-mapped file.
+
+distance_folder = './data/distance_matrices'
+
+def get_cosine_distance_matrix(data_matrix, max_bytes=2 * 1024 ** 3,
+    max_tile_size=2 ** 23):
+    '''
+    Computes squareform(pdist(data_matrix, 'cosine')) one block of rows at a
+    time, with at most max_tile_size entries per block. If the float64 matrix
+    would take more than max_bytes, returns a read-only float32 np.memmap
+    instead. Its file is unlinked right away, so the disk space is freed once
+    the last reference to the matrix is gone.
+    '''
+    num_rows = data_matrix.shape[0]
+    if num_rows ** 2 * np.dtype(np.float64).itemsize <= max_bytes:
+        distance_matrix, fname = np.empty((num_rows, num_rows)), None
+    else:
+        if not os.path.exists(distance_folder):
+            os.makedirs(distance_folder)
+        fd, fname = tempfile.mkstemp(suffix='.dat', dir=distance_folder)
+        os.close(fd)
+        distance_matrix = np.memmap(fname, dtype=np.float32, mode='w+',
+            shape=(num_rows, num_rows))
+
+    block_size = max(1, max_tile_size // max(num_rows, 1))
+    for start in range(0, num_rows, block_size):
+        end = min(start + block_size, num_rows)
+        tile = cdist(data_matrix[start:end], data_matrix, 'cosine')
+        # squareform has an exact zero diagonal.
+        tile[np.arange(end - start), np.arange(start, end)] = 0
+        distance_matrix[start:end] = tile
+
+    if fname != None:
+        distance_matrix.flush()
+        del distance_matrix
+        distance_matrix = np.memmap(fname, dtype=np.float32, mode='r',
+            shape=(num_rows, num_rows))
+        os.remove(fname)
+    return distance_matrix
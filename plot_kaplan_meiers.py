@@ -0,0 +1,56 @@
+### Author: Edward Huang
+
+import matplotlib
+# Use the Agg backend so that no display is needed.
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+from survival import kaplan_meier, read_survival_dataframe
+import sys
+
+### Plots the Kaplan-Meier curves of a death/time/cluster dataframe, with the
+### curves computed by survival.py. Censoring times are marked with a +.
+### Usage: python plot_kaplan_meiers.py dataframe_fname
+### The plot goes to ./results/survival_plots_seq/<dataframe name>.pdf.
+
+# Cluster 0 is the largest cluster.
+COLOR_DCT = {'0':'#00BFC4', '1':'#F8766D'}
+
+def plot_kaplan_meiers(time_arr, event_arr, cluster_arr, out_fname,
+    max_time=40):
+    '''
+    Plots one Kaplan-Meier curve per cluster, labeled with the cluster sizes.
+    '''
+    plt.figure(figsize=(5, 3.3))
+    for cluster in np.unique(cluster_arr)[::-1]:
+        is_clus = cluster_arr == cluster
+        km = kaplan_meier(time_arr[is_clus], event_arr[is_clus])
+        # The curve starts at 1 at time 0.
+        line = plt.step(np.append(0, km.time_arr), np.append(1, km.survival),
+            where='post', color=COLOR_DCT.get(str(cluster)), label='%d' % (
+            is_clus.sum()))[0]
+        is_censored = km.num_risk - km.num_events > np.append(km.num_risk[1:],
+            0)
+        plt.plot(km.time_arr[is_censored], km.survival[is_censored], '+',
+            color=line.get_color())
+    plt.xlim(0, max_time)
+    plt.ylim(0, 1.05)
+    plt.xlabel('Time (months)')
+    plt.ylabel('Probability of survival')
+    plt.legend(title='Cluster Size', loc='upper right')
+    plt.tight_layout()
+    plt.savefig(out_fname)
+    plt.close()
+
+def main():
+    if len(sys.argv) != 2:
+        print 'Usage: python %s dataframe_fname' % sys.argv[0]
+        exit()
+    df_fname = sys.argv[1]
+    out_fname = './results/survival_plots_seq/%s.pdf' % os.path.splitext(
+        os.path.basename(df_fname))[0]
+    plot_kaplan_meiers(*read_survival_dataframe(df_fname) + (out_fname,))
+
+if __name__ == '__main__':
+    main()
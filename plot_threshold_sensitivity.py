@@ -29,10 +29,12 @@ def run_clustering_scripts():
     command = 'python subcategorize_patients.py full'
     subprocess.call(command, shell=True)
     print command
+    # Build the enriched matrices for every threshold in a single sweep.
+    command = 'python build_patient_feature_matrix.py -d 50 -l %s' % ','.join(
+        '%g' % sim_thresh for sim_thresh in p_value_range)
+    subprocess.call(command, shell=True)
+    print command
     for sim_thresh in p_value_range:
-        command = 'python build_patient_feature_matrix.py 50 %g' % sim_thresh
-        subprocess.call(command, shell=True)
-        print command
         command = 'python subcategorize_patients.py full 50 > %s/%g.txt' % (
             out_folder, sim_thresh)
         subprocess.call(command, shell=True)
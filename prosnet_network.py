@@ -0,0 +1,241 @@
+### Author: Edward Huang
+
+from collections import namedtuple
+import file_operations
+import itertools
+import numpy as np
+from scipy.sparse import csr_matrix
+
+### Integer-indexed heterogeneous network for the ProSNet input. Nodes (herbs,
+### symptoms, syndromes, drugs, tests, history, proteins) are interned to ids.
+### Co-occurrence edges come from sparse products of patient incidence
+### matrices, and the edge list is written out in one pass.
+
+# Node type and file of every patient source. Symptom file must always come
+# before herb file here.
+SOURCE_TUPLES = [('m', 'cancer_other_info_mr_symp'), ('h',
+    'cancer_other_info_herbmed'), ('n', 'cancer_syndrome_syndromes'), ('d',
+    'cancer_drug_2017_sheet2'), ('t', 'cancer_check_20170324'), ('v',
+    'smoking_history')]
+
+# Binary patient x node incidence of one patient dictionary, in triplet form.
+# Row patient_idx[k] has a 1 in local column col_idx[k], and local column c
+# stands for the interned node node_ids[c].
+Incidence = namedtuple('Incidence', ['patient_idx', 'col_idx', 'node_ids'])
+
+class NodeIndex(object):
+    '''
+    Interns names to consecutive integer ids, in order of first appearance.
+    '''
+    def __init__(self):
+        self.name_lst, self.id_dct = [], {}
+
+    def __len__(self):
+        return len(self.name_lst)
+
+    def intern(self, name):
+        if name not in self.id_dct:
+            self.id_dct[name] = len(self.name_lst)
+            self.name_lst += [name]
+        return self.id_dct[name]
+
+    def intern_list(self, name_lst):
+        return np.array([self.intern(name) for name in name_lst],
+            dtype=np.int64)
+
+def get_incidence(patient_dct, patient_index, node_index):
+    '''
+    Builds the incidence of a patient dictionary, which maps inhospital_id's
+    to (feature, frequency) lists. A patient is incident to every feature in
+    its list, regardless of the frequency.
+    '''
+    local_index = NodeIndex()
+    patient_idx, col_idx = [], []
+    for inhospital_id, feature_lst in patient_dct.iteritems():
+        row_idx = patient_index.intern(inhospital_id)
+        for (feature, feature_freq) in feature_lst:
+            patient_idx += [row_idx]
+            col_idx += [local_index.intern(feature)]
+    return Incidence(np.array(patient_idx, dtype=np.int64), np.array(col_idx,
+        dtype=np.int64), node_index.intern_list(local_index.name_lst))
+
+def get_incidence_matrix(incidence, num_patients):
+    '''
+    Returns the num_patients x (local nodes) binary CSR incidence matrix.
+    '''
+    incidence_matrix = csr_matrix((np.ones(len(incidence.patient_idx)), (
+        incidence.patient_idx, incidence.col_idx)), shape=(num_patients, len(
+        incidence.node_ids)))
+    # Repeated features of a patient still count once.
+    incidence_matrix.data[:] = 1
+    return incidence_matrix
+
+def get_coocc_edges(incidence_a, incidence_b, num_patients):
+    '''
+    Gets the co-occurrence edges between the nodes of two incidences, as
+    (source ids, target ids, number of shared patients) arrays. Computed as
+    the sparse product A^T B of the incidence matrices. Self edges are
+    skipped, but other same-type edges are kept.
+    '''
+    coocc_matrix = get_incidence_matrix(incidence_a, num_patients).T.dot(
+        get_incidence_matrix(incidence_b, num_patients)).tocoo()
+    src_ids = incidence_a.node_ids[coocc_matrix.row]
+    dst_ids = incidence_b.node_ids[coocc_matrix.col]
+    is_kept = src_ids != dst_ids
+    return src_ids[is_kept], dst_ids[is_kept], coocc_matrix.data[is_kept]
+
+class EdgeList(object):
+    '''
+    Accumulates undirected edges between interned nodes. An edge and its
+    reverse are the same edge, and only the first weight added for an edge is
+    kept.
+    '''
+    def __init__(self):
+        self.src_lst, self.dst_lst, self.weight_lst = [], [], []
+
+    def add_edges(self, src_ids, dst_ids, weights=None):
+        if weights is None:
+            weights = np.ones(len(src_ids))
+        self.src_lst += [np.asarray(src_ids, dtype=np.int64)]
+        self.dst_lst += [np.asarray(dst_ids, dtype=np.int64)]
+        self.weight_lst += [np.asarray(weights, dtype=np.float64)]
+
+    def get_edges(self):
+        '''
+        Returns the canonical (low id, high id, weight) arrays of the unique
+        edges, in the order they were first added.
+        '''
+        if len(self.src_lst) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        src_ids = np.concatenate(self.src_lst)
+        dst_ids = np.concatenate(self.dst_lst)
+        weights = np.concatenate(self.weight_lst)
+        low_ids, high_ids = np.minimum(src_ids, dst_ids), np.maximum(src_ids,
+            dst_ids)
+        num_nodes = high_ids.max() + 1
+        first_idx = np.unique(low_ids * num_nodes + high_ids,
+            return_index=True)[1]
+        first_idx.sort()
+        return low_ids[first_idx], high_ids[first_idx], weights[first_idx]
+
+    def write(self, edge_fname, node_fname, node_index, edge_label='a',
+        weighted=False):
+        '''
+        Writes each edge in both directions, as tab-separated (node, node,
+        weight, label) lines. Weights are 1 unless weighted is set. Also writes
+        the nodes that appear in any edge.
+        '''
+        low_ids, high_ids, weights = self.get_edges()
+        name_lst = node_index.name_lst
+        if not weighted:
+            weights = np.ones(len(weights))
+        weight_lst = ['%g' % weight for weight in weights]
+        out = open(edge_fname, 'w')
+        out.write(''.join('%s\t%s\t%s\t%s\n%s\t%s\t%s\t%s\n' % (name_lst[low],
+            name_lst[high], weight, edge_label, name_lst[high], name_lst[low],
+            weight, edge_label) for low, high, weight in zip(low_ids.tolist(),
+            high_ids.tolist(), weight_lst)))
+        out.close()
+
+        # All nodes currently share the same node type.
+        out = open(node_fname, 'w')
+        out.write(''.join('%s\tb\n' % name_lst[node_id] for node_id in
+            np.unique(np.concatenate([low_ids, high_ids])).tolist()))
+        out.close()
+
+def read_network(node_fname, edge_fname):
+    '''
+    Reads the ProSNet node and edge lists. Returns the node list and the
+    weighted CSR adjacency matrix over it. Edges are already written in both
+    directions.
+    '''
+    f = open(node_fname, 'r')
+    node_lst = [line.split('\t')[0] for line in f]
+    f.close()
+    node_idx_dct = dict((node, i) for i, node in enumerate(node_lst))
+
+    src_lst, dst_lst, weight_lst = [], [], []
+    f = open(edge_fname, 'r')
+    for line in f:
+        node_a, node_b, weight = line.split('\t')[:3]
+        src_lst += [node_idx_dct[node_a]]
+        dst_lst += [node_idx_dct[node_b]]
+        weight_lst += [float(weight)]
+    f.close()
+    adj_matrix = csr_matrix((weight_lst, (src_lst, dst_lst)), shape=(len(
+        node_lst), len(node_lst)))
+    return node_lst, adj_matrix
+
+def get_patient_dct(fname):
+    if 'smoking_history' in fname:
+        patient_dct = file_operations.read_smoking_history()[0]
+        age_fname = './data/cancer_caseinfo.txt'
+        age_dct = file_operations.read_spreadsheet(age_fname)[0]
+        # Tack on age to the medical history.
+        for inhospital_id in patient_dct:
+            if inhospital_id in age_dct:
+                patient_dct[inhospital_id] += [(age_dct[inhospital_id][0])]
+    else:
+        fname = './data/%s.txt' % fname
+        patient_dct = file_operations.read_spreadsheet(fname)[0]
+    return patient_dct
+
+class ProsnetDataset(object):
+    '''
+    Every input of the ProSNet network, loaded once and held in interned form:
+    the patient sources of source_tuples, the protein-herb relations, the PPI
+    network and the herb-symptom dictionary. Edge lists for any subset of the
+    sources are then built without reloading anything.
+    '''
+    def __init__(self, source_tuples=SOURCE_TUPLES):
+        self.source_tuples = source_tuples
+        self.node_index, self.patient_index = NodeIndex(), NodeIndex()
+        # Maps each node type to the incidence of its patient source.
+        self.incidence_dct = {}
+        for node_type, fname in source_tuples:
+            self.incidence_dct[node_type] = get_incidence(get_patient_dct(
+                fname), self.patient_index, self.node_index)
+        # Prior knowledge edges, as (source ids, target ids) arrays.
+        self.protein_herb_edges = self.intern_pairs(
+            file_operations.get_protein_herb_edge_set())
+        hgnc_lst, src_idx_arr, dst_idx_arr = (
+            file_operations.read_ppi_edge_array())
+        protein_ids = self.node_index.intern_list(hgnc_lst)
+        self.ppi_edges = (protein_ids[src_idx_arr], protein_ids[dst_idx_arr])
+        self.symptom_herb_edges = self.intern_pairs(
+            file_operations.get_dictionary_symptom_herb_set())
+
+    def intern_pairs(self, name_pair_set):
+        # Sort, so the written network doesn't depend on set iteration order.
+        name_pair_lst = sorted(name_pair_set)
+        return (self.node_index.intern_list([pair[0] for pair in
+            name_pair_lst]), self.node_index.intern_list([pair[1] for pair in
+            name_pair_lst]))
+
+    def get_edge_list(self, node_type_lst=None):
+        '''
+        Builds the EdgeList of the network over the given node types, or over
+        all sources if node_type_lst is None. Co-occurrence edges are weighted
+        by their number of shared patients.
+        '''
+        if node_type_lst == None:
+            node_type_lst = [node_type for node_type, fname in
+                self.source_tuples]
+        # Keep the order of source_tuples, so symptoms come before herbs.
+        node_type_lst = [node_type for node_type, fname in self.source_tuples
+            if node_type in node_type_lst]
+
+        # Start off with the protein-herb list and PPI list.
+        edge_list = EdgeList()
+        edge_list.add_edges(*self.protein_herb_edges)
+        edge_list.add_edges(*self.ppi_edges)
+        # Loop through every pair of node types.
+        for node_type_a, node_type_b in itertools.combinations_with_replacement(
+            node_type_lst, 2):
+            edge_list.add_edges(*get_coocc_edges(self.incidence_dct[
+                node_type_a], self.incidence_dct[node_type_b], len(
+                self.patient_index)))
+            if node_type_a == 'm' and node_type_b == 'h':
+                edge_list.add_edges(*self.symptom_herb_edges)
+        return edge_list
@@ -0,0 +1,89 @@
+### Author: Edward Huang
+
+import numpy as np
+import os
+import re
+
+### Binary store for the low-dimensional vectors written by ProSNet. The text
+### output prosnet_vectors_<dim>_<iteration> is converted once into a .npy
+### matrix and a node list, which later runs memory-map.
+
+vector_folder = './data/prosnet_data'
+
+def get_vector_fname(num_dim, iteration):
+    return '%s/prosnet_vectors_%s_%s' % (vector_folder, num_dim, iteration)
+
+def get_snapshot_list(num_dim):
+    '''
+    Returns the sorted iteration numbers of the available vector snapshots,
+    in either text or converted form.
+    '''
+    snapshot_pattern = re.compile(r'^prosnet_vectors_%s_(\d+)(\.npy)?$' %
+        num_dim)
+    snapshot_set = set([])
+    for fname in os.listdir(vector_folder):
+        match = snapshot_pattern.match(fname)
+        if match != None:
+            snapshot_set.add(int(match.group(1)))
+    return sorted(snapshot_set)
+
+def convert_vector_file(text_fname):
+    '''
+    Converts a ProSNet text output file into text_fname.npy, which holds the
+    vector matrix, and text_fname_nodes.txt, which holds the node of each row.
+    '''
+    node_lst, vector_lst = [], []
+    f = open(text_fname, 'r')
+    num_nodes, num_dim = map(int, f.readline().split())
+    for line in f:
+        line = line.split()
+        node_lst += [line[0]]
+        vector_lst += [np.array(line[1:], dtype=np.float64)]
+        assert len(vector_lst[-1]) == num_dim
+    f.close()
+    assert len(node_lst) == len(set(node_lst))
+
+    out = open('%s_nodes.txt' % text_fname, 'w')
+    for node in node_lst:
+        out.write('%s\n' % node)
+    out.close()
+    # The matrix is written last, since its mtime marks the conversion.
+    np.save('%s.npy' % text_fname, np.array(vector_lst).reshape(len(node_lst),
+        num_dim))
+
+class ProsnetVectorStore(object):
+    '''
+    Memory-mapped ProSNet vectors of one snapshot, with a node to row index.
+    iteration defaults to the latest available snapshot.
+    '''
+    def __init__(self, num_dim, iteration=None):
+        if iteration == None:
+            snapshot_list = get_snapshot_list(num_dim)
+            assert len(snapshot_list) > 0, 'No ProSNet vectors for %s' % num_dim
+            iteration = snapshot_list[-1]
+        self.num_dim, self.iteration = int(num_dim), iteration
+
+        text_fname = get_vector_fname(num_dim, iteration)
+        npy_fname = '%s.npy' % text_fname
+        # Convert the text output if it's newer than its binary form.
+        if os.path.exists(text_fname) and (not os.path.exists(npy_fname) or
+            os.path.getmtime(npy_fname) < os.path.getmtime(text_fname)):
+            convert_vector_file(text_fname)
+
+        self.vector_matrix = np.load(npy_fname, mmap_mode='r')
+        assert self.vector_matrix.shape[1] == self.num_dim
+        f = open('%s_nodes.txt' % text_fname, 'r')
+        self.node_lst = [line.rstrip('\n') for line in f]
+        f.close()
+        self.node_idx_dct = dict((node, i) for i, node in enumerate(
+            self.node_lst))
+
+    def __contains__(self, node):
+        return node in self.node_idx_dct
+
+    def get_vector_matrix(self, node_lst):
+        '''
+        Returns the vectors of node_lst as rows of an in-memory array.
+        '''
+        return self.vector_matrix[[self.node_idx_dct[node] for node in
+            node_lst]]
@@ -4,139 +4,163 @@
 ### Author: Edward Huang
 
 import argparse
-import file_operations
+from disk_cache import get_file_hash
+import hashlib
+import numpy_embed
 import os
-import subprocess
+from prosnet_network import ProsnetDataset, SOURCE_TUPLES
+import prosnet_vectors
+import re
+import shutil
+import socket
 import string
+import subprocess
+import tempfile
+import time
 
 ### This script prepares the input files for Prosnet. Nodes need to be in a
 ### separate file.
 
-# Records the set of nodes already written to file. Also unique number of edges.
-global_node_set, global_edge_set, num_edge_types = set([]), set([]), 0
-
-def get_protein_herb_edge_set():
-    '''
-    Get the set of (protein, herb) edges.
-    '''
-    protein_herb_edge_set = set([])
-    f = open('./data/herb_protein_relations.txt', 'r')
-    for line in f:
-        line = line.strip().split('\t')
-        if len(line) < 3:
-            continue
-        # Format: Scientific name, Chinese name, list of proteins.
-        herb, protein_list = line[1], line[2:]
-        # Remove non-Chinese characters from the string.
-        herb = [c for c in herb.decode('utf-8') if u'\u4e00' <= c <= u'\u9fff']        
-        herb = ''.join(herb).encode('utf-8')
-        # Check that the string is all in Chinese.
-        assert all(u'\u4e00' <= c <= u'\u9fff' for c in herb.decode('utf-8'))
-        # Add the protein-herb edge.
-        for protein in protein_list:
-            protein_herb_edge_set.add((protein, herb))
-    f.close()
-    return protein_herb_edge_set
-
-def get_ppi_edge_set():
-    '''
-    Get the protein-protein edge set from a PPI network.
-    '''
-    entrez_to_hgnc_dct = file_operations.get_entrez_to_hgnc_dct()
-
-    ppi_edge_set = set([])
-    # Gene ID's in this PPI network are Entrez ID's.
-    f = open('./data/HumanNet.v1.benchmark.txt', 'r')
-    for line in f:
-        line = line.split()
-        assert len(line) == 2
-        node_a, node_b = line
-        # Skip if no HGNC analogues.
-        if node_a not in entrez_to_hgnc_dct or node_b not in entrez_to_hgnc_dct:
-            continue
-        # Translate the Entrez ID to HGNC protein.
-        ppi_edge_set.add((entrez_to_hgnc_dct[node_a], entrez_to_hgnc_dct[node_b]))
-    f.close()
-    return ppi_edge_set
-
-def get_patient_dct(fname):
-    if 'smoking_history' in fname:
-        patient_dct = file_operations.read_smoking_history()[0]
-        age_fname = './data/cancer_caseinfo.txt'
-        age_dct = file_operations.read_spreadsheet(age_fname)[0]
-        # Tack on age to the medical history.
-        for inhospital_id in patient_dct:
-            if inhospital_id in age_dct:
-                patient_dct[inhospital_id] += [(age_dct[inhospital_id][0])]
-    else:
-        fname = './data/%s.txt' % fname
-        patient_dct = file_operations.read_spreadsheet(fname)[0]
-    return patient_dct
-
-def get_coocc_edge_set(patient_dct_a, patient_dct_b):
-    '''
-    Get the symptom-herb relations from the co-occurrence counts of the patient
-    records.
-    '''
-    coocc_edge_set = set([])
-    # Get the intersecting set of patients in both dictionaries.
-    patient_set = set(patient_dct_a.keys()).intersection(patient_dct_b.keys())
-    for inhospital_id in patient_set:
-        for (node_a, node_a_freq) in patient_dct_a[inhospital_id]:
-            for (node_b, node_b_freq) in patient_dct_b[inhospital_id]:
-                # We skip self edges, but keep other same-type edges.
-                if node_a != node_b:
-                    coocc_edge_set.add((node_a, node_b))
-    return coocc_edge_set
-
-# def write_edges(node_out, edge_out, edge_set, node_type_a, node_type_b):
-def write_edges(edge_out, edge_set, node_type_tup):
-    '''
-    Write the edges out to file. edge_label is just a letter to differentiate
-    amongst the different types of edges. We write nodes out as integers, so
-    map_out contains a word on each line corresponding to these integers.
-    '''
-    global global_node_set, global_edge_set, num_edge_types
-
-    for edge in edge_set:
-        # Check if edge has already been written.
-        if edge in global_edge_set or edge[::-1] in global_edge_set:
-            continue
-        global_edge_set.add(edge)
-
-        # Write out the edge.
-        edge_label = string.ascii_lowercase[num_edge_types]
-        for i in range(2):
-            global_node_set.add((edge[i], 'b')) # TODO
-            # global_node_set.add((edge[i], node_type_tup[i]))
-            edge_out.write('%s\t%s\t1\t%s\n' % (edge[i], edge[1 - i], edge_label))
-    # num_edge_types += 1 # TODO: uncomment.
-
-def write_nodes():
-    node_out = open('./data/prosnet_data/prosnet_node_list.txt', 'w')
-    for node_pair in global_node_set:
-        node_out.write('%s\t%s\n' % node_pair)
-    node_out.close()
-
-def run_prosnet():
-    os.chdir('../prosnet')
-    network_folder = '../cancer_survival_tcm/data/prosnet_data'
+# Number of distinct edge types. Currently all edges share one type.
+num_edge_types = 0
+network_folder = os.path.abspath('./data/prosnet_data')
+# Trained vectors, one folder per hash of the network files and embed flags.
+embed_cache_folder = '%s/embed_cache' % network_folder
+
+def get_embed_param_lst(num_dim):
+    '''
+    Returns the embed training flags as (flag, value) tuples. Thread count and
+    file paths are left out, since they don't define the embedding.
+    '''
+    return [('binary', 0), ('size', num_dim), ('negative', 5), ('samples', 1),
+        ('iters', 501), ('model', 2), ('depth', 10), ('restart', 0.8),
+        ('edge_type_num', num_edge_types + 1), ('train_mode', 2)]
+
+def get_embed_cache_key(num_dim, backend='embed'):
+    '''
+    Hashes the written network files, every embed flag and the backend.
+    Identical keys produce interchangeable vectors.
+    '''
+    md5 = hashlib.md5()
+    for fname in ('prosnet_edge_list.txt', 'prosnet_node_list.txt',
+        'meta.txt'):
+        fname = '%s/%s' % (network_folder, fname)
+        if os.path.exists(fname):
+            md5.update('%s\t%s\n' % (fname, get_file_hash(fname)))
+    md5.update(repr(get_embed_param_lst(num_dim)))
+    # Keys of the embed binary predate the backend choice.
+    if backend != 'embed':
+        md5.update(backend)
+    return md5.hexdigest()
+
+def get_vector_output_lst(num_dim):
+    '''
+    Returns the vector files of every snapshot, text and converted.
+    '''
+    output_lst = []
+    for iteration in prosnet_vectors.get_snapshot_list(num_dim):
+        text_fname = prosnet_vectors.get_vector_fname(num_dim, iteration)
+        output_lst += [fname for fname in (text_fname, '%s.npy' % text_fname,
+            '%s_nodes.txt' % text_fname) if os.path.exists(fname)]
+    return output_lst
+
+def clear_vector_outputs(num_dim):
+    '''
+    Deletes the vector files of every snapshot, so that none are left from
+    another network or set of flags.
+    '''
+    for fname in get_vector_output_lst(num_dim):
+        os.remove(fname)
 
+def run_embed_binary(num_dim, num_threads, output_folder):
+    '''
+    Runs the embed binary of ../prosnet, writing the vectors to
+    output_folder. Returns its return code and command.
+    '''
     command = ('./embed -node %s/prosnet_node_list.txt -link '
-        '%s/prosnet_edge_list.txt -meta_path %s/meta.txt -output %s/prosnet_vectors_%s -binary 0 -size %s -negative 5 -samples 1 '
-        '-iters 501 -threads 12 -model 2 -depth 10 -restart 0.8 '
-        '-edge_type_num %d -train_mode 2' % (
-            network_folder, network_folder, network_folder, network_folder,
-            args.num_dim, args.num_dim, num_edge_types + 1))
+        '%s/prosnet_edge_list.txt -meta_path %s/meta.txt -output %s/prosnet_vectors_%s %s '
+        '-threads %d' % (network_folder, network_folder, network_folder,
+            output_folder, num_dim, ' '.join('-%s %s' % param for param in
+            get_embed_param_lst(num_dim)), num_threads))
     print command
-    subprocess.call(command, shell=True)
+    return subprocess.call(command, shell=True, cwd='../prosnet'), command
 
-    # Rename the resulting file, depending on whether we exclude treatments.
-    # if args.excl_treat == None:
-    #     out_fname = '%s/embed_%s_450_treatments.txt' % (network_folder, args.num_dim)
-    # else:
-    #     out_fname = '%s/embed_%s_450_no_treatments.txt' % (network_folder, args.num_dim)
-    # os.rename('%s/embed_%s_450.txt' % (network_folder, args.num_dim), out_fname)
+def run_numpy_embed(num_dim, num_threads, output_folder):
+    '''
+    Trains the vectors in-process with numpy_embed, using the embed flags,
+    writing them to output_folder. Returns the equivalent command string, for
+    logging.
+    '''
+    param_dct = dict(get_embed_param_lst(num_dim))
+    kwarg_dct = dict((param, param_dct[param]) for param in ('negative',
+        'samples', 'iters', 'depth', 'restart'))
+    command = 'numpy_embed %s -threads %d' % (' '.join('-%s %s' % param for
+        param in sorted(kwarg_dct.items())), num_threads)
+    print command
+    numpy_embed.embed_network('%s/prosnet_node_list.txt' % network_folder,
+        '%s/prosnet_edge_list.txt' % network_folder,
+        '%s/prosnet_vectors_%s' % (output_folder, num_dim), num_dim,
+        num_threads, **kwarg_dct)
+    return command
+
+def run_prosnet(num_dim, num_threads=12, use_cache=True, backend='embed'):
+    '''
+    Trains the ProSNet vectors on the written network, unless an identical
+    network and set of flags were already trained. In that case, the cached
+    outputs are restored instead. backend is either the embed binary or the
+    in-process 'numpy' trainer.
+    '''
+    cache_folder = '%s/%s' % (embed_cache_folder, get_embed_cache_key(num_dim,
+        backend))
+    if use_cache and os.path.exists('%s/provenance.txt' % cache_folder):
+        clear_vector_outputs(num_dim)
+        for fname in os.listdir(cache_folder):
+            if fname != 'provenance.txt':
+                shutil.copy2('%s/%s' % (cache_folder, fname), network_folder)
+        print 'Restored cached ProSNet vectors from %s' % cache_folder
+        return
+
+    # Train into a fresh folder, so that everything in it is this run's
+    # output, whatever the file system's mtime resolution.
+    output_folder = tempfile.mkdtemp(prefix='training_', dir=network_folder)
+    start_time = time.time()
+    if backend == 'numpy':
+        command = run_numpy_embed(num_dim, num_threads, output_folder)
+        return_code = 0
+    else:
+        return_code, command = run_embed_binary(num_dim, num_threads,
+            output_folder)
+    train_time = time.time() - start_time
+
+    # Convert the text vectors once, so later reads can memory-map them.
+    snapshot_pattern = re.compile(r'^prosnet_vectors_%s_\d+$' % num_dim)
+    for fname in os.listdir(output_folder):
+        if return_code == 0 and snapshot_pattern.match(fname) != None:
+            prosnet_vectors.convert_vector_file('%s/%s' % (output_folder,
+                fname))
+    # Replace the snapshots of earlier runs with this run's.
+    clear_vector_outputs(num_dim)
+    output_lst = []
+    for fname in sorted(os.listdir(output_folder)):
+        shutil.move('%s/%s' % (output_folder, fname), network_folder)
+        output_lst += ['%s/%s' % (network_folder, fname)]
+    os.rmdir(output_folder)
+
+    # Only cache complete runs.
+    if return_code != 0 or output_lst == []:
+        return
+    if os.path.exists(cache_folder):
+        shutil.rmtree(cache_folder)
+    os.makedirs(cache_folder)
+    for fname in output_lst:
+        shutil.copy2(fname, cache_folder)
+    # Provenance goes last, since it marks the entry as complete.
+    out = open('%s/provenance.txt' % cache_folder, 'w')
+    out.write('command\t%s\n' % command)
+    out.write('train_seconds\t%f\n' % train_time)
+    out.write('finished\t%s\n' % time.strftime('%Y-%m-%d %H:%M:%S'))
+    out.write('host\t%s\n' % socket.gethostname())
+    out.close()
 
 def parse_args():
     global args
@@ -144,54 +168,40 @@ def parse_args():
     parser.add_argument('-d', '--num_dim', help='number of ProSNet dimensions',
         required=True, type=int)
     parser.add_argument('-e', '--excl_treat', help='whether to exclude treatments (drugs and herbs)')
+    parser.add_argument('-w', '--weighted', action='store_true', help='use co-occurrence counts as edge weights')
+    parser.add_argument('-r', '--retrain', action='store_true', help='train even if the embedding cache has these vectors')
+    parser.add_argument('-b', '--backend', choices=['embed', 'numpy'], default='embed', help='embed binary or in-process NumPy trainer')
     args = parser.parse_args()
 
-def main():
-    parse_args()
-
-    # Symptom file must always come before herb file here.
-    f_tuples = [('m', 'cancer_other_info_mr_symp'), ('h', 'cancer_other_info_herbmed'),
-        ('n', 'cancer_syndrome_syndromes'), ('d', 'cancer_drug_2017_sheet2'),
-        ('t', 'cancer_check_20170324'), ('v', 'smoking_history')]
+def write_network(excl_treat=None, weighted=False):
+    '''
+    Writes the ProSNet input network: the edge list and the node list.
+    '''
+    # Load every input once. Sources are then picked by node type.
+    dataset = ProsnetDataset()
+    node_type_lst = [node_type for node_type, fname in SOURCE_TUPLES]
     # Exclude treatments if excl_treat is not None.
-    if args.excl_treat != None:
-        f_tuples = [tup for tup in f_tuples if tup[0] not in ['h', 'd']]
+    if excl_treat != None:
+        node_type_lst = [node_type for node_type in node_type_lst if node_type
+            not in ['h', 'd']]
 
     # Create the folder and files for the ProSNet input network.
-    input_folder = './data/prosnet_data'
-    if not os.path.exists(input_folder):
-        os.makedirs(input_folder)
-    # node_out = open('%s/prosnet_node_list.txt' % input_folder, 'w')
-    edge_out = open('%s/prosnet_edge_list.txt' % input_folder, 'w')
-
-    # Start off by writing out the protein-herb list and PPI list.
-    protein_herb_edge_set = get_protein_herb_edge_set()
-    write_edges(edge_out, protein_herb_edge_set, ('p', 'h'))
-    ppi_edge_set = get_ppi_edge_set()
-    write_edges(edge_out, ppi_edge_set, ('p', 'p'))
-
-    # Loop through every pair of node types.
-    for i in range(len(f_tuples)):
-        node_type_a, fname_a = f_tuples[i]
-        patient_dct_a = get_patient_dct(fname_a)
-        for j in range(i, len(f_tuples)):
-            node_type_b, fname_b = f_tuples[j]
-            patient_dct_b = get_patient_dct(fname_b)
-            # Get the co-occurrence edge set.
-            edge_set = get_coocc_edge_set(patient_dct_a, patient_dct_b)
-
-            if node_type_a == 'm' and node_type_b == 'h':
-                edge_set = edge_set.union(file_operations.get_dictionary_symptom_herb_set())
-
-            # Write the edges out to file.
-            write_edges(edge_out, edge_set, (node_type_a, node_type_b))
-            
-    edge_out.close()
-
-    write_nodes()
+    if not os.path.exists(network_folder):
+        os.makedirs(network_folder)
+    edge_list = dataset.get_edge_list(node_type_lst)
+    # Write the edges and nodes out to file.
+    edge_list.write('%s/prosnet_edge_list.txt' % network_folder,
+        '%s/prosnet_node_list.txt' % network_folder, dataset.node_index,
+        string.ascii_lowercase[num_edge_types], weighted)
+
+def main():
+    parse_args()
+
+    write_network(args.excl_treat, args.weighted)
 
     # Run prosnet. Outputs the low-dimensional vectors into files.
-    run_prosnet()
+    run_prosnet(args.num_dim, use_cache=not args.retrain,
+        backend=args.backend)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
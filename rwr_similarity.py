@@ -0,0 +1,93 @@
+### Author: Edward Huang
+
+import numpy as np
+from prosnet_network import read_network
+from scipy.sparse import csr_matrix, diags
+
+### Random walk with restart (RWR) proximities between features, computed
+### directly on the ProSNet input network written by run_prosnet.py. Needs no
+### trained vectors, so it can stand in for the ProSNet cosine similarities
+### in the enrichment.
+
+network_folder = './data/prosnet_data'
+
+def get_transition_matrix(adj_matrix):
+    '''
+    Returns the transpose of the row-normalized adjacency matrix, so that
+    multiplying it with a node distribution takes one walk step.
+    '''
+    degree_arr = np.asarray(adj_matrix.sum(axis=1)).ravel()
+    inv_degree_arr = np.divide(1.0, degree_arr, out=np.zeros(len(degree_arr)),
+        where=degree_arr != 0)
+    return diags(inv_degree_arr).dot(adj_matrix).T.tocsr()
+
+def get_rwr_matrix(transition_matrix, seed_idx_arr, restart, tol=1e-8,
+    max_iter=100):
+    '''
+    Power iteration for the RWR distributions of a batch of seed nodes at
+    once. Each column of the returned num_nodes x num_seeds matrix is the
+    stationary distribution of a walk that returns to its seed with
+    probability restart at every step.
+    '''
+    seed_matrix = np.zeros((transition_matrix.shape[0], len(seed_idx_arr)))
+    seed_matrix[seed_idx_arr, np.arange(len(seed_idx_arr))] = restart
+    rwr_matrix = seed_matrix.copy()
+    for i in range(max_iter):
+        next_rwr_matrix = (1 - restart) * transition_matrix.dot(rwr_matrix) + (
+            seed_matrix)
+        delta = np.abs(next_rwr_matrix - rwr_matrix).max()
+        rwr_matrix = next_rwr_matrix
+        if delta < tol:
+            break
+    return rwr_matrix
+
+def get_rwr_similarity_matrix(master_feature_lst, restart=0.8,
+    sim_thresh=None, top_k=None, batch_size=256):
+    '''
+    Computes the RWR proximity of every feature to every other feature, with
+    each feature in master_feature_lst as a seed. Entry (i, j) is the
+    probability of feature j in the walk seeded at feature i. Proximities
+    below sim_thresh are dropped, and each row keeps only its top_k largest.
+    Features missing from the network have no neighbors. The diagonal is
+    always 1, as in the cosine similarity matrix. Returns a sparse CSR matrix.
+    '''
+    node_lst, adj_matrix = read_network('%s/prosnet_node_list.txt' %
+        network_folder, '%s/prosnet_edge_list.txt' % network_folder)
+    transition_matrix = get_transition_matrix(adj_matrix)
+    node_idx_dct = dict((node, i) for i, node in enumerate(node_lst))
+    # Column in the similarity matrix and node of every networked feature.
+    feature_idx_arr = np.array([i for i, feature in enumerate(
+        master_feature_lst) if feature in node_idx_dct], dtype=np.int64)
+    feature_node_arr = np.array([node_idx_dct[master_feature_lst[i]] for i in
+        feature_idx_arr], dtype=np.int64)
+    print 'features in the RWR network:', len(feature_idx_arr)
+
+    row_idx_lst, col_idx_lst, data_lst = [], [], []
+    for start in range(0, len(feature_idx_arr), batch_size):
+        end = min(start + batch_size, len(feature_idx_arr))
+        # Proximities from the seeds (rows) to the networked features.
+        tile = get_rwr_matrix(transition_matrix, feature_node_arr[start:end],
+            restart)[feature_node_arr].T
+        keep = tile != 0
+        if sim_thresh != None:
+            keep &= tile >= sim_thresh
+        # The diagonal is set separately.
+        keep[np.arange(end - start), np.arange(start, end)] = False
+        if top_k != None and top_k < tile.shape[1]:
+            masked_tile = np.where(keep, tile, -np.inf)
+            rank_idx = np.argpartition(-masked_tile, top_k - 1, axis=1)
+            is_top_k = np.zeros(tile.shape, dtype=bool)
+            is_top_k[np.arange(end - start)[:, np.newaxis], rank_idx[:,
+                :top_k]] = True
+            keep &= is_top_k
+        tile_row_idx, tile_col_idx = np.nonzero(keep)
+        row_idx_lst += [feature_idx_arr[tile_row_idx + start]]
+        col_idx_lst += [feature_idx_arr[tile_col_idx]]
+        data_lst += [tile[tile_row_idx, tile_col_idx]]
+    # Refill diagonals with 1s.
+    num_features = len(master_feature_lst)
+    row_idx_lst += [np.arange(num_features)]
+    col_idx_lst += [np.arange(num_features)]
+    data_lst += [np.ones(num_features)]
+    return csr_matrix((np.concatenate(data_lst), (np.concatenate(row_idx_lst),
+        np.concatenate(col_idx_lst))), shape=(num_features, num_features))
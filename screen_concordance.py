@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+### Author: Edward Huang
+
+import argparse
+from cluster_cancer_subtypes import get_subtype_labels
+from file_operations import read_feature_matrix
+import numpy as np
+import os
+from survival import concordance_index_columns, get_survival_arrays
+
+### Ranks every feature by its prognostic value within each cancer subtype,
+### with Harrell's C-index of the feature values against the survival times.
+### All columns of a subtype are scored in one batched call. Writes one table
+### per subtype to ./results/concordance_screening/<matrix>_<subtype>.txt,
+### in the feature\tvalue\ttag format of the feature p-value files, sorted by
+### how far each C-index is from 0.5. The tag is > if patients with larger
+### values die sooner, and < if they live longer. Subtypes without comparable
+### pairs give NaN C-indices, written last with the tag NA. The concordant,
+### discordant and tied pair counts go to <matrix>_<subtype>_pairs.txt.
+### Usage: python screen_concordance.py [-m MATRIX]
+
+def write_concordance_table(feature_list, c_index_arr, concordant_arr,
+    discordant_arr, tied_arr, out_name, pairs_name):
+    '''
+    Writes feature, C-index and tag to out_name, as the feature p-value files,
+    by decreasing distance of the C-index from 0.5. Features without
+    comparable pairs have a NaN C-index, and go last. The pair counts go to
+    pairs_name, in the same order.
+    '''
+    out = open(out_name, 'w')
+    pairs_out = open(pairs_name, 'w')
+    pairs_out.write('feature\tconcordant\tdiscordant\ttied\n')
+    for i in sorted(range(len(feature_list)), key=lambda i: (np.isnan(
+        c_index_arr[i]), -abs(c_index_arr[i] - 0.5))):
+        if np.isnan(c_index_arr[i]):
+            tag = 'NA'
+        elif c_index_arr[i] == 0.5:
+            tag = '='
+        elif c_index_arr[i] > 0.5:
+            tag = '>'
+        else:
+            tag = '<'
+        out.write('%s\t%g\t%s\n' % (feature_list[i], c_index_arr[i], tag))
+        pairs_out.write('%s\t%d\t%d\t%d\n' % (feature_list[i],
+            concordant_arr[i], discordant_arr[i], tied_arr[i]))
+    out.close()
+    pairs_out.close()
+
+def screen_subtype(feature_matrix, feature_list, survival_mat, out_name,
+    pairs_name):
+    '''
+    Scores the features of one subtype's patients. Features with the same
+    value for every patient are skipped.
+    '''
+    feature_matrix = np.asarray(feature_matrix, dtype=np.float64)
+    is_varying = (feature_matrix != feature_matrix[0]).any(axis=0)
+    time_arr, event_arr = get_survival_arrays(survival_mat)
+    c_index_arr, concordant_arr, discordant_arr, tied_arr = (
+        concordance_index_columns(time_arr, event_arr, feature_matrix[:,
+        is_varying]))
+    write_concordance_table([feature for i, feature in enumerate(feature_list)
+        if is_varying[i]], c_index_arr, concordant_arr, discordant_arr,
+        tied_arr, out_name, pairs_name)
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--matrix', default='raw', help='Optional. Feature matrix suffix, e.g. raw, 500_0.3 or rwr_0.001_k50.')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results_folder = './results/concordance_screening'
+    if not os.path.exists(results_folder):
+        os.makedirs(results_folder)
+
+    feature_matrix, feature_list, survival_mat = read_feature_matrix('_%s' %
+        args.matrix)
+    subtype_labels = get_subtype_labels(survival_mat)
+    for subtype in [1, 2]:
+        idx_lst = [i for i, label in enumerate(subtype_labels) if label ==
+            subtype]
+        out_name = '%s/%s_%d' % (results_folder, args.matrix, subtype)
+        screen_subtype(feature_matrix[idx_lst], feature_list, [survival_mat[i]
+            for i in idx_lst], '%s.txt' % out_name, '%s_pairs.txt' % out_name)
+
+if __name__ == '__main__':
+    main()
@@ -4,21 +4,21 @@
 ### Author: Edward Huang
 
 from collections import Counter
+from column_stats import ttest_columns
+from decomposition import pca_transform
 from file_operations import read_feature_matrix, read_spreadsheet
 from file_operations import read_smoking_history
+from kmeans_restarts import fit_kmeans
 import os
 import numpy as np
 import operator
 from scipy.spatial.distance import pdist, squareform
-from scipy.stats import ttest_ind
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
 from sklearn.preprocessing import normalize
-import subprocess
+from survival import summarize_dataframe_folder
 import sys
 
 def generate_directories():
-    global df_folder, feat_folder
+    global df_folder, feat_folder, plot_folder
     df_folder = './data/patient_dataframes_%s' % matrix_type
     feat_folder = './results/feature_p_values_%s' % matrix_type
     plot_folder = './results/survival_plots_%s' % matrix_type
@@ -59,14 +59,13 @@ def get_cluster_labels(feature_matrix, num_clusters):
     # TODO: PCA.
     num_comp = int(feature_matrix.shape[1] * 0.5)
     # num_comp = 50
-    pca = PCA(n_components=num_comp)
     distance_matrix = normalize(feature_matrix, norm='l1')
-    distance_matrix = pca.fit_transform(distance_matrix)
+    distance_matrix = pca_transform(distance_matrix, num_comp
+        ).transformed_matrix
     # distance_matrix = squareform(pdist(feature_matrix, metric='cityblock'))
 
-    est = KMeans(n_clusters=num_clusters, n_init=1000, random_state=930519)
-    est.fit(distance_matrix)
-    return list(est.labels_)
+    return fit_kmeans(distance_matrix, n_clusters=num_clusters, n_init=1000,
+        random_state=930519).labels
 
     # distance_matrix = squareform(pdist(feature_matrix, metric='cityblock'))
     # est = KMeans(n_clusters=num_clusters, n_init=1000, random_state=930519)
@@ -102,33 +101,16 @@ def get_cluster_symptoms(clus_idx_lst, feature_list, feature_matrix,
     Given a list of patient indices, and a symptom feature matrix, find the
     symptoms that best characterize the patients.
     '''
-    symptom_cands = []
-    # Get the rows in the feature matrix belonging to the cluster.
-    cluster_matrix = feature_matrix[clus_idx_lst]
-
-    # Get the matrix of non-cluster patients.
-    non_clus_idx_lst = [i for i in range(len(feature_matrix)
-        ) if i not in clus_idx_lst]
-    non_clus_matrix = feature_matrix[non_clus_idx_lst]
-
-    assert len(clus_idx_lst) + len(non_clus_idx_lst) == len(feature_matrix)
-
-    for symp_idx in symp_idx_lst:
-        clus_col = cluster_matrix[:,symp_idx]
-        non_clus_col = non_clus_matrix[:,symp_idx]
+    # Compare the cluster's patients against all other patients.
+    is_clus = np.zeros(len(feature_matrix), dtype=bool)
+    is_clus[clus_idx_lst] = True
+    ttest = ttest_columns(feature_matrix[:, symp_idx_lst], is_clus)
 
-        with np.errstate(invalid='ignore'):
-            t_stat, p_value = ttest_ind(clus_col, non_clus_col)
-
-        if (p_value / 2.0) < 0.1:
+    symptom_cands = []
+    for i, symp_idx in enumerate(symp_idx_lst):
+        if ttest.p_value[i] < 0.1:
             symptom = feature_list[symp_idx]
-            clus_mean, non_clus_mean = np.mean(clus_col), np.mean(non_clus_col)
-            if clus_mean == non_clus_mean:
-                symptom += '='
-            elif clus_mean > non_clus_mean:
-                symptom += '>'
-            elif clus_mean < non_clus_mean:
-                symptom += '<'
+            symptom += {0:'=', 1:'>', -1:'<'}[ttest.direction[i]]
             symptom_cands += [symptom]
     return ', '.join(symptom_cands) + '\n'
 
@@ -143,39 +125,21 @@ def feature_analysis(labels, feature_matrix, feature_list, out_name,
     assert feature_matrix.shape == (len(labels), len(feature_list))
     # Get the label of the most common cluster.
     max_clus = Counter(labels).most_common(1)[0][0]
-    # 'a' denotes the largest cluster.
-    max_clus_idx_lst = [i for i, e in enumerate(labels) if e == max_clus]
-    # Merge the smaller clusters.
-    merged_clus_idx_lst = [i for i, e in enumerate(labels) if e != max_clus]
+    # 'a' denotes the largest cluster, the smaller clusters are merged.
+    ttest = ttest_columns(feature_matrix, np.asarray(labels) == max_clus)
 
     # Maps features to p-values of t-tests for the two clusters.
     p_val_dct = {}
     for feature_idx, feature in enumerate(feature_list):
-        column = feature_matrix[:,feature_idx]
-        # This is the feature values for the larger cluster.
-        max_feat_list = column[max_clus_idx_lst]
-        assert len(max_feat_list) == len(max_clus_idx_lst)
-        # Feature values for merged clusters.
-        merged_feat_list = column[merged_clus_idx_lst]
-        assert len(max_feat_list) + len(merged_feat_list) == len(labels)
-        # Compute the unpaired t-test between the two samples of features.
-        with np.errstate(invalid='ignore'):
-            t_stat, p_value = ttest_ind(max_feat_list, merged_feat_list)
+        p_value = ttest.p_value[feature_idx]
         if np.isnan(p_value):
-            p_value = 1
-
+            p_value = 0.5
         # > marker means that largest cluster has a larger mean than the
         # combined clusters.
-        max_mean, merge_mean = np.mean(max_feat_list), np.mean(merged_feat_list)
-        # assert len(max_feat_list) > len(merged_feat_list)
-        if max_mean == merge_mean:
-            tag = '='
-        elif max_mean > merge_mean:
-            # TODO. Currently showing the size of the '>' sign.
-            tag = '%d>' % len(max_feat_list)
-        else:
-            tag = '<'
-        p_val_dct[(feature, tag)] = p_value / 2.0
+        # TODO. Currently showing the size of the '>' sign.
+        tag = {0:'=', 1:'%d>' % ttest.count_a, -1:'<'}[ttest.direction[
+            feature_idx]]
+        p_val_dct[(feature, tag)] = p_value
 
     p_val_dct = sorted(p_val_dct.items(), key=operator.itemgetter(1))
 
@@ -294,9 +258,9 @@ def main():
     else:
         sequential_cluster()
 
-    # Call the R script.
-    command = 'Rscript survival_model.R %s' % df_folder
-    subprocess.call(command, shell=True)
+    # Log-rank tests and Kaplan-Meier summaries of every dataframe.
+    summarize_dataframe_folder(df_folder, '%s/survival_summary.txt' %
+        plot_folder)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,422 @@
+### Author: Edward Huang
+
+from collections import namedtuple
+import numpy as np
+import os
+from scipy.stats import chi2, norm
+
+### Survival statistics, computed natively so that the clustering sweeps do
+### not need to shell out to R for every cluster. Kaplan-Meier curves, their
+### median and restricted mean follow survfit, and the log-rank test survdiff.
+
+def get_risk_table(time_arr, event_arr, group_arr):
+    '''
+    Returns the distinct event times, and the number of deaths and the number
+    at risk at each of them, both overall and per group. group_arr holds group
+    indices 0..k-1.
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    group_arr = np.asarray(group_arr)
+    num_groups = group_arr.max() + 1
+    event_time_arr = np.unique(time_arr[event_arr])
+
+    death_matrix = np.zeros((len(event_time_arr), num_groups))
+    risk_matrix = np.zeros((len(event_time_arr), num_groups))
+    for group in range(num_groups):
+        group_time_arr = np.sort(time_arr[group_arr == group])
+        # Patients with time >= t are at risk at t.
+        risk_matrix[:, group] = len(group_time_arr) - np.searchsorted(
+            group_time_arr, event_time_arr, side='left')
+        group_death_arr = np.sort(time_arr[(group_arr == group) & event_arr])
+        death_matrix[:, group] = np.searchsorted(group_death_arr,
+            event_time_arr, side='right') - np.searchsorted(group_death_arr,
+            event_time_arr, side='left')
+    return event_time_arr, death_matrix, risk_matrix
+
+def logrank_test(time_arr, event_arr, group_arr):
+    '''
+    k-group log-rank test, as R's survdiff with rho = 0. Groups can be any
+    labels. Returns the chi-squared statistic and its p-value with k - 1
+    degrees of freedom.
+    '''
+    group_arr = np.unique(group_arr, return_inverse=True)[1]
+    event_time_arr, death_matrix, risk_matrix = get_risk_table(time_arr,
+        event_arr, group_arr)
+    num_deaths, num_risk = death_matrix.sum(axis=1), risk_matrix.sum(axis=1)
+    risk_frac = risk_matrix / num_risk[:, np.newaxis]
+    expected = np.dot(num_deaths, risk_frac)
+    # As survdiff, only groups expected to have deaths are compared.
+    has_expected = expected > 0
+    num_groups = has_expected.sum()
+    if num_groups < 2:
+        return 0.0, 1.0
+    risk_frac = risk_frac[:, has_expected]
+    observed_minus_expected = death_matrix[:, has_expected].sum(axis=0) - (
+        expected[has_expected])
+    # Hypergeometric variance, with the tie correction.
+    tie_weight = np.divide(num_deaths * (num_risk - num_deaths), num_risk - 1,
+        out=np.zeros(len(num_risk)), where=num_risk > 1)
+    var_matrix = np.diag(np.dot(tie_weight, risk_frac)) - np.dot(
+        risk_frac.T * tie_weight, risk_frac)
+
+    # The first group is redundant, and dropped as in survdiff.
+    diff = observed_minus_expected[1:]
+    chisq = np.dot(diff, np.linalg.solve(var_matrix[1:, 1:], diff))
+    return chisq, chi2.sf(chisq, num_groups - 1)
+
+# One Kaplan-Meier curve, at every distinct time (event or censoring). std_err
+# is Greenwood's standard error of the cumulative hazard, as survfit's.
+KaplanMeier = namedtuple('KaplanMeier', ['time_arr', 'num_risk',
+    'num_events', 'survival', 'std_err'])
+# One row of R's print(survfit(...), print.rmean=T).
+SurvivalSummary = namedtuple('SurvivalSummary', ['group', 'num_patients',
+    'num_events', 'rmean', 'rmean_se', 'median', 'median_lcl', 'median_ucl'])
+
+def get_survival_arrays(survival_mat):
+    '''
+    Returns the time and death arrays of a list of (inhospital_id, death,
+    time) tuples.
+    '''
+    time_arr = np.array([time for (inhospital_id, death, time) in
+        survival_mat], dtype=np.float64)
+    event_arr = np.array([death for (inhospital_id, death, time) in
+        survival_mat], dtype=bool)
+    return time_arr, event_arr
+
+def kaplan_meier(time_arr, event_arr):
+    '''
+    Kaplan-Meier estimate, as survfit. Sorts once, and gets the number at
+    risk from cumulative counts.
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    unique_time_arr, inverse_arr, count_arr = np.unique(time_arr,
+        return_inverse=True, return_counts=True)
+    num_events = np.bincount(inverse_arr, weights=event_arr, minlength=len(
+        unique_time_arr))
+    # Patients with time >= t are at risk at t.
+    num_risk = len(time_arr) - np.concatenate(([0], np.cumsum(count_arr)[:-1]))
+    survival = np.cumprod((num_risk - num_events) / num_risk)
+    with np.errstate(divide='ignore'):
+        hazard_var = num_events / (num_risk * (num_risk - num_events))
+    std_err = np.sqrt(np.cumsum(hazard_var))
+    return KaplanMeier(unique_time_arr, num_risk, num_events, survival, std_err)
+
+def get_confidence_band(km, conf_int=0.95):
+    '''
+    Returns the lower and upper pointwise confidence limits of the survival,
+    with survfit's default log transform. Limits are nan where the survival
+    is 0.
+    '''
+    z = norm.ppf(1 - (1 - conf_int) / 2.0)
+    with np.errstate(invalid='ignore'):
+        lower = np.where(km.survival > 0, km.survival * np.exp(-z *
+            km.std_err), np.nan)
+        upper = np.where(km.survival > 0, np.minimum(km.survival * np.exp(z *
+            km.std_err), 1), np.nan)
+    return lower, upper
+
+def get_first_crossing(curve, time_arr):
+    '''
+    Returns the first time the curve drops to 0.5, as print.survfit does. If
+    the curve sits at exactly 0.5, returns the midpoint between that time and
+    the time of its next drop. nan if the curve never gets there.
+    '''
+    tolerance = np.sqrt(np.finfo(np.float64).eps)
+    with np.errstate(invalid='ignore'):
+        keep = curve < 0.5 + tolerance
+    curve, time_arr = curve[keep], time_arr[keep]
+    if len(curve) == 0:
+        return np.nan
+    if abs(curve[0] - 0.5) < tolerance and np.any(curve < curve[0]):
+        return (time_arr[0] + time_arr[np.argmax(curve < curve[0])]) / 2.0
+    return time_arr[0]
+
+def get_median_survival(km, conf_int=0.95):
+    '''
+    Returns the median survival time, and the limits of its confidence
+    interval.
+    '''
+    lower, upper = get_confidence_band(km, conf_int)
+    return (get_first_crossing(km.survival, km.time_arr), get_first_crossing(
+        lower, km.time_arr), get_first_crossing(upper, km.time_arr))
+
+def restricted_mean_survival(km, end_time, start_time=0):
+    '''
+    Restricted mean survival time, the area under the curve between
+    start_time and end_time, and its standard error, as survfit's rmean.
+    '''
+    keep = km.time_arr <= end_time
+    time_arr = np.append(km.time_arr[keep], end_time)
+    survival = np.append(km.survival[keep], km.survival[keep][-1] if np.any(
+        keep) else 1.0)
+    num_risk, num_events = km.num_risk[keep], km.num_events[keep]
+    hazard_var = np.zeros(len(num_risk))
+    np.divide(num_events, num_risk * (num_risk - num_events), out=hazard_var,
+        where=num_risk > num_events)
+
+    rectangles = np.diff(np.append(start_time, time_arr)) * np.append(1.0,
+        survival[:-1])
+    # Area under the curve after each event time.
+    tail_area = np.cumsum(rectangles[::-1])[::-1][1:]
+    return start_time + rectangles.sum(), np.sqrt(np.sum(tail_area ** 2 *
+        hazard_var))
+
+def get_survival_summary(time_arr, event_arr, group_arr, end_time=None):
+    '''
+    Returns a SurvivalSummary for each group, in sorted order. The restricted
+    means share one upper limit, by default the largest time of any group
+    (print.rmean=T).
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    group_arr = np.asarray(group_arr)
+    if end_time == None:
+        end_time = time_arr.max()
+    start_time = min(0, time_arr.min())
+
+    summary_lst = []
+    for group in np.unique(group_arr):
+        is_group = group_arr == group
+        km = kaplan_meier(time_arr[is_group], event_arr[is_group])
+        rmean, rmean_se = restricted_mean_survival(km, end_time, start_time)
+        summary_lst += [SurvivalSummary(group, int(is_group.sum()), int(
+            event_arr[is_group].sum()), rmean, rmean_se,
+            *get_median_survival(km))]
+    return summary_lst
+
+def print_survival_summary(summary_lst):
+    print '%-12s %6s %6s %8s %10s %7s %8s %8s' % ('cluster', 'n', 'events',
+        '*rmean', '*se(rmean)', 'median', '0.95LCL', '0.95UCL')
+    for summary in summary_lst:
+        print '%-12s %6d %6d %8.2f %10.2f %7g %8g %8g' % (summary.group,
+            summary.num_patients, summary.num_events, summary.rmean,
+            summary.rmean_se, summary.median, summary.median_lcl,
+            summary.median_ucl)
+
+def read_survival_dataframe(fname):
+    '''
+    Reads a death/time/cluster dataframe, as written by the clustering
+    scripts. Returns the time, death and cluster arrays.
+    '''
+    death_lst, time_lst, cluster_lst = [], [], []
+    f = open(fname, 'r')
+    f.readline()
+    for line in f:
+        death, time, cluster = line.strip().split('\t')
+        death_lst += [int(death)]
+        time_lst += [float(time)]
+        cluster_lst += [cluster]
+    f.close()
+    return np.array(time_lst), np.array(death_lst, dtype=bool), np.array(
+        cluster_lst)
+
+def summarize_dataframe_folder(df_folder, out_fname):
+    '''
+    Runs the log-rank test and the Kaplan-Meier summaries on every dataframe
+    in df_folder, and writes one row per (dataframe, cluster) to out_fname.
+    '''
+    out = open(out_fname, 'w')
+    out.write('dataframe\tchisq\tp_value\tcluster\tn\tevents\trmean\t'
+        'se_rmean\tmedian\tlcl\tucl\n')
+    for fname in sorted(os.listdir(df_folder)):
+        time_arr, event_arr, cluster_arr = read_survival_dataframe('%s/%s' % (
+            df_folder, fname))
+        chisq, p_value = logrank_test(time_arr, event_arr, cluster_arr)
+        for summary in get_survival_summary(time_arr, event_arr, cluster_arr):
+            out.write('%s\t%g\t%g\t%s\t%d\t%d\t%g\t%g\t%g\t%g\t%g\n' % ((fname,
+                chisq, p_value) + tuple(summary)))
+    out.close()
+
+def get_group_risk_tables(time_arr, event_arr, group_matrix):
+    '''
+    Risk tables of many two-group splits of the same patients at once. Each
+    row of group_matrix is a boolean split. Returns the distinct times, the
+    overall deaths and number at risk at each, and the deaths and number at
+    risk of each row's True group (rows by times).
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    # Sort once, and sum each row within the blocks of tied times.
+    order = np.argsort(time_arr, kind='mergesort')
+    time_arr, event_arr = time_arr[order], event_arr[order]
+    group_matrix = np.asarray(group_matrix, dtype=np.float64)[:, order]
+    unique_time_arr, start_arr = np.unique(time_arr, return_index=True)
+
+    count_arr = np.diff(np.append(start_arr, len(time_arr)))
+    num_risk = len(time_arr) - np.concatenate(([0], np.cumsum(count_arr)[:-1]))
+    num_deaths = np.add.reduceat(event_arr.astype(np.float64), start_arr)
+    group_count_matrix = np.add.reduceat(group_matrix, start_arr, axis=1)
+    # Patients with time >= t are at risk at t.
+    group_risk_matrix = np.cumsum(group_count_matrix[:, ::-1], axis=1)[:, ::-1]
+    group_death_matrix = np.add.reduceat(group_matrix * event_arr, start_arr,
+        axis=1)
+    return (unique_time_arr, num_deaths, num_risk, group_death_matrix,
+        group_risk_matrix)
+
+def logrank_test_columns(num_deaths, num_risk, group_death_matrix,
+    group_risk_matrix):
+    '''
+    Two-group log-rank test of every row of get_group_risk_tables' output.
+    Returns the chi-squared statistics and their p-values.
+    '''
+    risk_frac = group_risk_matrix / num_risk
+    observed_minus_expected = (group_death_matrix - num_deaths * risk_frac).sum(
+        axis=1)
+    # Hypergeometric variance, with the tie correction.
+    tie_weight = np.divide(num_deaths * (num_risk - num_deaths), num_risk - 1,
+        out=np.zeros(len(num_risk)), where=num_risk > 1)
+    var_arr = np.dot(risk_frac * (1 - risk_frac), tie_weight)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chisq = observed_minus_expected ** 2 / var_arr
+    return chisq, chi2.sf(chisq, 1)
+
+def get_median_survival_columns(event_time_arr, death_matrix, risk_matrix):
+    '''
+    Kaplan-Meier median survival of every row of a risk table, with the rule
+    of get_first_crossing. Rows may include times at which they have no
+    patients, where their curve stays flat.
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factor_matrix = np.where(risk_matrix > 0, (risk_matrix - death_matrix
+            ) / risk_matrix, 1)
+    survival_matrix = np.cumprod(factor_matrix, axis=1)
+    tolerance = np.sqrt(np.finfo(np.float64).eps)
+
+    keep_matrix = survival_matrix < 0.5 + tolerance
+    first_arr = np.argmax(keep_matrix, axis=1)
+    first_surv_arr = survival_matrix[np.arange(len(first_arr)), first_arr]
+    drop_matrix = survival_matrix < first_surv_arr[:, np.newaxis]
+    next_arr = np.argmax(drop_matrix, axis=1)
+    is_midpoint = (np.abs(first_surv_arr - 0.5) < tolerance) & drop_matrix.any(
+        axis=1)
+    median_arr = np.where(is_midpoint, (event_time_arr[first_arr] +
+        event_time_arr[next_arr]) / 2.0, event_time_arr[first_arr])
+    return np.where(keep_matrix.any(axis=1), median_arr, np.nan)
+
+def get_dense_ranks(score_matrix):
+    '''
+    Returns the rank of every entry within its column, from 1, with tied
+    values sharing a rank, and the largest rank of any column.
+    '''
+    col_arr = np.arange(score_matrix.shape[1])
+    order_matrix = np.argsort(score_matrix, axis=0, kind='mergesort')
+    sorted_matrix = score_matrix[order_matrix, col_arr]
+    sorted_rank_matrix = np.cumsum(np.vstack([np.ones((1, len(col_arr)),
+        dtype=int), np.diff(sorted_matrix, axis=0) != 0]), axis=0)
+    rank_matrix = np.empty_like(sorted_rank_matrix)
+    rank_matrix[order_matrix, col_arr] = sorted_rank_matrix
+    return rank_matrix, sorted_rank_matrix[-1].max()
+
+def concordance_index_columns(time_arr, event_arr, score_matrix):
+    '''
+    Harrell's C-index of every column of score_matrix (patients by columns),
+    where higher scores should die sooner. A pair is comparable if the
+    earlier time is a death, or if both times are equal and only one is a
+    death. Tied scores count one half. Patients are added to one Fenwick tree
+    of score ranks per column in decreasing order of time, so each death
+    counts the lower and equal scores among those who outlived it in
+    O(log n). Returns the C-indices, and the concordant, discordant and tied
+    pair counts of each column.
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    score_matrix = np.asarray(score_matrix, dtype=np.float64)
+    num_cols = score_matrix.shape[1]
+    rank_matrix, num_ranks = get_dense_ranks(score_matrix)
+    col_arr = np.arange(num_cols)
+    # Row 0 is never updated, and row num_ranks + 1 is never read.
+    tree = np.zeros((num_ranks + 2, num_cols), dtype=np.int64)
+
+    def add(rank_arr):
+        idx_arr = rank_arr.copy()
+        while (idx_arr <= num_ranks).any():
+            tree[idx_arr, col_arr] += 1
+            idx_arr = np.minimum(idx_arr + (idx_arr & -idx_arr), num_ranks + 1)
+
+    def count_at_most(rank_arr):
+        total, idx_arr = np.zeros(num_cols, dtype=np.int64), rank_arr.copy()
+        while (idx_arr > 0).any():
+            total += tree[idx_arr, col_arr]
+            idx_arr -= idx_arr & -idx_arr
+        return total
+
+    concordant, tied = np.zeros(num_cols), np.zeros(num_cols)
+    num_comparable, num_added = 0, 0
+    order = np.argsort(-time_arr, kind='mergesort')
+    start_arr = np.unique(-time_arr[order], return_index=True)[1]
+    for block in np.split(order, start_arr[1:]):
+        # Censored patients outlive the deaths at their own time.
+        for patient_idx in block[~event_arr[block]]:
+            add(rank_matrix[patient_idx])
+        num_added += np.sum(~event_arr[block])
+        for patient_idx in block[event_arr[block]]:
+            num_lower = count_at_most(rank_matrix[patient_idx] - 1)
+            concordant += num_lower
+            tied += count_at_most(rank_matrix[patient_idx]) - num_lower
+            num_comparable += num_added
+        for patient_idx in block[event_arr[block]]:
+            add(rank_matrix[patient_idx])
+        num_added += np.sum(event_arr[block])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        c_index = (concordant + 0.5 * tied) / float(num_comparable)
+    return c_index, concordant, num_comparable - concordant - tied, tied
+
+def concordance_index(time_arr, event_arr, risk_arr):
+    '''
+    Harrell's C-index of one set of risk scores. See
+    concordance_index_columns.
+    '''
+    return concordance_index_columns(time_arr, event_arr, np.asarray(
+        risk_arr)[:, np.newaxis])[0][0]
+
+def get_step_values(km, time_arr, is_left_limit=False):
+    '''
+    Returns the Kaplan-Meier curve at each time, or just before it.
+    '''
+    idx_arr = np.searchsorted(km.time_arr, time_arr, side='left' if
+        is_left_limit else 'right')
+    return np.append(1.0, km.survival)[idx_arr]
+
+def time_dependent_auc(train_time_arr, train_event_arr, time_arr, event_arr,
+    risk_arr, eval_time_arr):
+    '''
+    Cumulative/dynamic AUC of the risk scores at each evaluation time, with
+    inverse probability of censoring weights (Hung and Chiang), as survAUC's
+    AUC.hc. Cases died by time t and are weighted by 1 / G(T-), where G is
+    the censoring Kaplan-Meier curve of the training patients. Controls
+    outlived t. Also returns the integrated AUC, weighted by the drops of the
+    training survival curve between evaluation times. AUCs are nan at times
+    without cases or controls.
+    '''
+    time_arr, event_arr = np.asarray(time_arr, dtype=np.float64), np.asarray(
+        event_arr, dtype=bool)
+    risk_arr = np.asarray(risk_arr, dtype=np.float64)
+    eval_time_arr = np.asarray(eval_time_arr, dtype=np.float64)
+    censor_km = kaplan_meier(train_time_arr, ~np.asarray(train_event_arr,
+        dtype=bool))
+    with np.errstate(divide='ignore'):
+        case_weight = np.where(event_arr, 1 / get_step_values(censor_km,
+            time_arr, True), 0)
+    # Patients with no chance of being observed get no weight.
+    case_weight[~np.isfinite(case_weight)] = 0
+    score_matrix = (risk_arr[:, np.newaxis] > risk_arr) + 0.5 * (
+        risk_arr[:, np.newaxis] == risk_arr)
+
+    auc_arr = np.zeros(len(eval_time_arr))
+    for i, eval_time in enumerate(eval_time_arr):
+        weight_arr = case_weight * (time_arr <= eval_time)
+        is_control = time_arr > eval_time
+        denom = weight_arr.sum() * is_control.sum()
+        auc_arr[i] = np.dot(weight_arr, score_matrix[:, is_control].sum(
+            axis=1)) / denom if denom > 0 else np.nan
+
+    train_km = kaplan_meier(train_time_arr, train_event_arr)
+    drop_arr = -np.diff(np.append(1.0, get_step_values(train_km,
+        eval_time_arr)))
+    is_valid = ~np.isnan(auc_arr)
+    iauc = np.dot(auc_arr[is_valid], drop_arr[is_valid]) / drop_arr[
+        is_valid].sum() if drop_arr[is_valid].sum() > 0 else np.nan
+    return auc_arr, iauc
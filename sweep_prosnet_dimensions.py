@@ -0,0 +1,98 @@
+### Author: Edward Huang
+
+import argparse
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import run_prosnet
+import subprocess
+
+### This script sweeps the number of ProSNet dimensions. It writes the network
+### once and trains the embeddings for all dimensions concurrently, splitting
+### a global core budget across the embed processes. It then enriches and
+### clusters for each dimension, and writes the log-rank chi-squared and
+### p-values of each subtype to a table for plot_dimension_sensitivity.R.
+
+def parse_args():
+    global args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--num_dim_list', default='300,400,500,600,700',
+        help='comma-separated numbers of ProSNet dimensions')
+    parser.add_argument('-s', '--sim_thresh', default='0.3',
+        help='cosine similarity threshold for the enrichment')
+    parser.add_argument('-c', '--num_cores', type=int,
+        default=multiprocessing.cpu_count(), help='total cores for embed')
+    parser.add_argument('-j', '--num_jobs', type=int,
+        help='number of concurrent embed runs, defaults to one per dimension')
+    args = parser.parse_args()
+    args.num_dim_list = map(int, args.num_dim_list.split(','))
+    if args.num_jobs == None:
+        args.num_jobs = min(len(args.num_dim_list), args.num_cores)
+    assert args.num_jobs > 0
+
+def read_logrank_table(base_fname):
+    '''
+    Reads the log-rank statistics out of the table that
+    cluster_cancer_subtypes.py writes for a sweep. Returns a list of (subtype,
+    chi-squared, p-value) tuples.
+    '''
+    logrank_lst = []
+    f = open('./results/cluster_sweep_%s.txt' % base_fname, 'r')
+    f.readline()
+    for line in f:
+        features, subtype, large_size, small_size, chisq, p_value = (
+            line.rstrip('\n').split('\t'))
+        logrank_lst += [(subtype, float(chisq), float(p_value))]
+    f.close()
+    return logrank_lst
+
+def cluster_matrix(num_processes, num_dim=None):
+    '''
+    Builds the feature matrix and clusters the patients with num_processes
+    k-means processes. Uses the ProSNet enrichment if num_dim is given, and
+    the raw matrix otherwise.
+    '''
+    prosnet_args = '' if num_dim == None else ' -d %d -s %s' % (num_dim,
+        args.sim_thresh)
+    subprocess.check_call('python build_patient_feature_matrix.py%s' %
+        prosnet_args, shell=True)
+    subprocess.check_call('python cluster_cancer_subtypes.py%s -p 1 -j %d' % (
+        prosnet_args, num_processes), shell=True)
+    return read_logrank_table('raw' if num_dim == None else 'prosnet_%d_%s' % (
+        num_dim, args.sim_thresh))
+
+def train_and_cluster(num_dim):
+    # Each concurrent embed run gets an equal share of the cores.
+    num_threads = max(1, args.num_cores // args.num_jobs)
+    run_prosnet.run_prosnet(num_dim, num_threads)
+    return num_dim, cluster_matrix(num_threads, num_dim)
+
+def write_sensitivity_table(baseline_lst, result_lst):
+    out = open('./results/dimension_sensitivity.txt', 'w')
+    out.write('method\tnum_dim\tsubtype\tchisq\tp_value\n')
+    for num_dim, logrank_lst in result_lst:
+        for method, method_logrank_lst in (('HEMnet', logrank_lst),
+            ('Baseline', baseline_lst)):
+            for (subtype, chisq, p_value) in method_logrank_lst:
+                out.write('%s\t%d\t%s\t%g\t%g\n' % (method, num_dim, subtype,
+                    chisq, p_value))
+    out.close()
+
+def main():
+    parse_args()
+    if not os.path.exists('./results'):
+        os.makedirs('./results')
+
+    run_prosnet.write_network()
+    # The raw matrix is shared by all dimensions, so build it first.
+    baseline_lst = cluster_matrix(args.num_cores)
+
+    pool = ThreadPool(args.num_jobs)
+    result_lst = pool.map(train_and_cluster, args.num_dim_list)
+    pool.close()
+    pool.join()
+
+    write_sensitivity_table(baseline_lst, sorted(result_lst))
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,39 @@
 ### Author: Edward Huang
 
 import numpy as np
-import itertools
 import subprocess
 
 ### This script reads the output of cluster_cancer_subtypes.py and outputs
 ### the feature types that produce significant results.
 
-def script_call(sim_thresh):
+def script_call(sim_thresh_lst):
     # for num_dim in [100, 200, 300, 400, 500]:
     # TODO: add in num_dim after cluster_cancer_subtypes.py seq 50.
-    subprocess.call('python build_patient_feature_matrix.py -d 500 -s %s' %
-        sim_thresh, shell=True)
-    # subprocess.call('python cluster_cancer_subtypes.py %s %s partial > '
-    #     './results/%s_%s_out' % (metric, num_dim, metric, num_dim), shell=True)
-    subprocess.call('python cluster_cancer_subtypes.py -d 500 -s %s' % (sim_thresh),
+    # Build the matrices for all thresholds off one similarity computation.
+    subprocess.call('python build_patient_feature_matrix.py -d 500 -l %s' %
+        ','.join('%g' % sim_thresh for sim_thresh in sim_thresh_lst),
         shell=True)
+    for sim_thresh in sim_thresh_lst:
+        # subprocess.call('python cluster_cancer_subtypes.py %s %s partial > '
+        #     './results/%s_%s_out' % (metric, num_dim, metric, num_dim), shell=True)
+        subprocess.call('python cluster_cancer_subtypes.py -d 500 -s %g' % (
+            sim_thresh), shell=True)
 
 
 def main():
 
-    # for sim_thresh in np.arange(0.1, 1.0, 0.1):
-    #     script_call(sim_thresh)
+    # script_call(np.arange(0.1, 1.0, 0.1))
 
-    f = open('out', 'r')
-    # line = f.readline()
     for sim_thresh in np.arange(0.1, 1.0, 0.1):
-        feature_list = ['tests', 'symptoms', 'herbs', 'drugs', 'history']
-        feat_comb_list = itertools.chain.from_iterable(itertools.combinations(
-            feature_list, r) for r in range(len(feature_list) + 1))
-        for feat_comb in feat_comb_list:
-            if feat_comb == ():
-                continue
-            one = f.readline().split()[1]
-            two = f.readline().split()[1]
+        # One row per feature combination and subtype, subtype 1 first.
+        f = open('./results/cluster_sweep_prosnet_500_%g.txt' % sim_thresh, 'r')
+        line_lst = f.readlines()[1:]
+        f.close()
+        for line_one, line_two in zip(line_lst[::2], line_lst[1::2]):
+            feat_comb, one = line_one.split()[0], line_one.split()[-1]
+            two = line_two.split()[-1]
             if float(one) < 0.01 and float(two) < 0.01:
-                print sim_thresh, feat_comb, one, two
+                print sim_thresh, tuple(feat_comb.split(',')), one, two
     # while line != '':
     #     feat_set = feat_comb_list.next()
     #     print line.split()
@@ -43,7 +41,6 @@ def main():
     #     two = f.readline().split()[1]
     #     if float(one) < 0.2 and float(two) < 0.2:
     #         print feat_set, one, two
-    f.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file